@@ -1,17 +1,151 @@
 # agent.py
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from tools import AVAILABLE_TOOLS
+import threading
+from tools import AVAILABLE_TOOLS, TOOL_SCHEMAS
 from memory import recall
+from cache import response_cache
+from scheduler import request_scheduler
+from tracing import tracer, llm_cost
+from context import MAX_PROMPT_TOKENS, MAX_MEMORY_TOKENS, count_tokens, fit_memories
 import json
 
-load_dotenv(override=True)
-client = OpenAI()
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Creates the OpenAI client on first use, so importing the agent (or running --help) stays fast."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from dotenv import load_dotenv
+                from openai import OpenAI
+                load_dotenv(override=True)
+                # Retries are handled by the request scheduler, which knows about the shared quota.
+                _client = OpenAI(max_retries=0)
+    return _client
 
 RANK_XP_THRESHOLDS = {"F": 50, "E": 150, "D": 300, "C": 600, "B": 1200, "A": 2500, "S": 5000}
 RANKS = list(RANK_XP_THRESHOLDS.keys())
 
+
+def rank_for_xp(xp):
+    """The highest rank whose XP threshold has been reached (F if none)."""
+    achieved = "F"
+    for rank in RANKS:
+        if xp >= RANK_XP_THRESHOLDS[rank]:
+            achieved = rank
+        else:
+            break
+    return achieved
+
+# How many times an agent may call tools before it has to give its final answer.
+MAX_TOOL_ROUNDS = 3
+# Completion size assumed when reserving tokens-per-minute quota; corrected once usage is known.
+EXPECTED_COMPLETION_TOKENS = 800
+
+
+def estimate_tokens(request):
+    """A quick upper-end guess of a request's total tokens (about four characters per token)."""
+    return len(json.dumps(request.get("messages", []))) // 4 + EXPECTED_COMPLETION_TOKENS
+
+
+def _create_completion(priority, consume=None, **request):
+    """Sends a chat completion through the rate-limiting request scheduler (see RequestScheduler.call)."""
+    return request_scheduler.call(
+        request["model"],
+        lambda: get_client().chat.completions.create(**request),
+        estimated_tokens=estimate_tokens(request),
+        priority=priority,
+        consume=consume,
+    )
+
+
+def complete(on_token=None, priority=0, **request):
+    """
+    Runs a chat completion through the shared response cache.
+    Returns the assistant message as a dict, including any tool calls the model requested.
+    If `on_token` is given the completion is streamed and each piece of text is passed to it as it arrives.
+    Cache misses wait their turn in the request scheduler; higher `priority` goes first.
+    """
+    key = response_cache.make_key(request)
+    with tracer.span(f"llm {request['model']}", "llm", model=request["model"]) as span:
+        cached = response_cache.get(key)
+        span.set(cache_hit=cached is not None)
+        if cached is not None:
+            if on_token and cached.get("content"):
+                on_token(cached["content"])
+            return cached
+
+        if on_token:
+            reply, usage = _stream_completion(on_token, priority, **request)
+        else:
+            response = _create_completion(priority, **request)
+            usage = getattr(response, "usage", None)
+            message = response.choices[0].message
+            reply = {"role": "assistant", "content": message.content}
+            if message.tool_calls:
+                reply["tool_calls"] = [
+                    {"id": call.id, "type": "function",
+                     "function": {"name": call.function.name, "arguments": call.function.arguments}}
+                    for call in message.tool_calls
+                ]
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                     cost_usd=llm_cost(request["model"], prompt_tokens, completion_tokens))
+        response_cache.set(key, reply)
+        return reply
+
+
+def _stream_completion(on_token, priority, **request):
+    """
+    Streams a completion, forwarding text deltas to `on_token` and reassembling any tool calls.
+    Returns the reply and the token usage reported in the stream's last chunk (None if absent).
+    A stream that breaks off is retried by the scheduler from the start.
+    """
+    streamed = []  # Whether any text has reached on_token yet.
+
+    def consume(stream, attempt):
+        if attempt and streamed:
+            on_token("\n[The connection dropped; starting this answer again.]\n")
+        content = []
+        tool_calls = {}
+        usage = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                    streamed.append(True)
+                    on_token(delta.content)
+                # Tool calls arrive in fragments identified by their index in the final list.
+                for fragment in delta.tool_calls or []:
+                    call = tool_calls.setdefault(fragment.index, {"id": None, "type": "function",
+                                                                  "function": {"name": "", "arguments": ""}})
+                    if fragment.id:
+                        call["id"] = fragment.id
+                    if fragment.function and fragment.function.name:
+                        call["function"]["name"] += fragment.function.name
+                    if fragment.function and fragment.function.arguments:
+                        call["function"]["arguments"] += fragment.function.arguments
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+
+        reply = {"role": "assistant", "content": "".join(content) or None}
+        if tool_calls:
+            reply["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+        return (reply, usage), usage
+
+    return _create_completion(priority, consume=consume, stream=True, stream_options={"include_usage": True},
+                              **request)
+
 class ShadowAgent:
     def __init__(self, agent_id, rank, specialty, guild_config):
         self.agent_id = agent_id
@@ -26,91 +160,82 @@ class ShadowAgent:
         """Sets the agent's prompt based on its guild configuration."""
         self.system_prompt = self.guild_config["prompts"].get(self.specialty, "You are a helpful assistant.")
 
-    def perform_task(self, prompt):
-        """A more advanced method where the agent can decide to use tools based on its prompt."""
+    def perform_task(self, prompt, on_token=None, priority=0):
+        """
+        Answers the task in a single model call, letting the model request tools natively.
+        Only when a tool is actually called does the agent loop back with the tool's result.
+        Pass `on_token` to receive the answer's text as it is streamed; `priority` orders
+        this agent's model calls against everyone else's when the quota is tight.
+        """
         print(f"\nAgent {self.agent_id} ({self.rank} Rank) is analyzing the task: '{prompt[:50]}...'")
 
         # --- NEW: Recall Step ---
         # The agent first tries to recall similar past work from memory.
         recalled_memories = recall(query=prompt)
+        # Memories only get the part of the prompt budget the task itself leaves free.
+        memory_budget = min(MAX_MEMORY_TOKENS,
+                            MAX_PROMPT_TOKENS - count_tokens(self.system_prompt) - count_tokens(prompt))
+        recalled_memories = fit_memories(recalled_memories, max(0, memory_budget))
         memory_context = ""
         if recalled_memories:
             memory_context = "I found this in my memory from a similar past job, which might be a useful reference:\n---\n" + "\n\n".join(
-                recalled_memories) + "\n---"
+                recalled_memories) + "\n---\n\n"
             print(f"Agent {self.agent_id} recalled relevant memories.")
 
-        # --- The rest of the method proceeds as before ---
-        # It will use the memory_context when deciding on a tool or formulating an answer.
-        tool_decision_prompt = f"""
-                {memory_context}
-
-                You have access to the following tools: {list(AVAILABLE_TOOLS.keys())}.
-                Based on the user's request, should you use a tool?
-                If yes, respond with the JSON format: {{"tool_name": "name", "tool_input": "input for the tool"}}
-                If no, respond with "NO_TOOL".
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": memory_context + prompt}
+        ]
 
-                User Request: "{prompt}"
-                """
+        # The model either answers directly or asks for tools; tool results are fed back until it answers.
+        for _ in range(MAX_TOOL_ROUNDS):
+            message = complete(on_token, priority, model="gpt-4o", messages=messages, tools=TOOL_SCHEMAS)
+            tool_calls = message.get("tool_calls")
+            if not tool_calls:
+                print(f"Agent {self.agent_id} answered without needing another tool.")
+                return message["content"]
 
-        # 1. Decision Making: The agent uses a powerful model to decide if a tool is needed.
-        # This prompt asks the model to "think" and choose a tool.
-        tool_decision_prompt = f"""
-        You have access to the following tools: {list(AVAILABLE_TOOLS.keys())}.
-        Based on the user's request, should you use a tool?
-        If yes, respond with the JSON format: {{"tool_name": "name", "tool_input": "input for the tool"}}
-        If no, respond with "NO_TOOL".
+            messages.append(message)
+            for tool_call in tool_calls:
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "content": self.use_tool(tool_call["function"]["name"], tool_call["function"]["arguments"])
+                })
 
-        User Request: "{prompt}"
-        """
+        # Out of tool rounds: force a plain answer from what has been gathered so far.
+        print(f"Agent {self.agent_id} reached the tool limit. Writing the final answer.")
+        return complete(on_token, priority, model="gpt-4o", messages=messages, tools=TOOL_SCHEMAS,
+                        tool_choice="none")["content"]
 
+    def use_tool(self, tool_name, arguments):
+        """Runs a tool requested by the model and returns its result as text for the conversation."""
+        if tool_name not in AVAILABLE_TOOLS:
+            return f"Unknown tool '{tool_name}'. Available tools: {list(AVAILABLE_TOOLS.keys())}."
         try:
-            # The agent "thinks" about which tool to use
-            decision_response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "system", "content": "You are a reasoning engine that decides which tool to use."},
-                          {"role": "user", "content": tool_decision_prompt}]
-            ).choices[0].message.content
-
-            if "NO_TOOL" in decision_response:
-                # 2a. No Tool Used: Proceed with a standard text response.
-                print(f"Agent {self.agent_id} decided no tool is needed.")
-                final_prompt = prompt
-            else:
-                # 2b. Tool Used: Parse the decision and call the correct tool function.
-                tool_choice = json.loads(decision_response)
-                tool_name = tool_choice["tool_name"]
-                tool_input = tool_choice["tool_input"]
-
-                if tool_name in AVAILABLE_TOOLS:
-                    print(f"Agent {self.agent_id} decided to use the '{tool_name}' tool.")
-                    tool_function = AVAILABLE_TOOLS[tool_name]
-                    tool_result = tool_function(tool_input)
-
-                    # 3. Integration: The agent incorporates the tool's result.
-                    final_prompt = f"The user's request was: '{prompt}'. I used the '{tool_name}' tool and got this result: '{tool_result}'. Now, provide a comprehensive final answer."
-                else:
-                    final_prompt = prompt  # Fallback if tool name is wrong
-
-        except Exception as e:
-            print(f"An error occurred during tool decision: {e}. Proceeding without a tool.")
-            final_prompt = prompt
-
-        # 4. Final Response Generation
-        final_response = client.chat.completions.create(
-            model="gpt-4o",  # Use a powerful model for the final answer
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": final_prompt}
-            ]
-        ).choices[0].message.content
+            tool_input = json.loads(arguments or "{}")
+        except json.JSONDecodeError as e:
+            return f"Could not parse the arguments for '{tool_name}': {e}"
 
-        return final_response
+        print(f"Agent {self.agent_id} decided to use the '{tool_name}' tool.")
+        with tracer.span(f"tool {tool_name}", "tool", agent=self.agent_id) as span:
+            try:
+                return str(AVAILABLE_TOOLS[tool_name](**tool_input))
+            except Exception as e:
+                span.set(error=str(e))
+                return f"The '{tool_name}' tool failed: {e}"
 
 
-    def create_image(self, prompt):
+    def create_image(self, prompt, priority=0):
         print(f"\nAgent {self.agent_id} ({self.rank} Rank {self.specialty}) is creating an image...")
         try:
-            response = client.images.generate(model="dall-e-3", prompt=prompt, size="1024x1024", n=1)
+            with tracer.span("llm dall-e-3", "llm", model="dall-e-3", agent=self.agent_id) as span:
+                response = request_scheduler.call(
+                    "dall-e-3",
+                    lambda: get_client().images.generate(model="dall-e-3", prompt=prompt, size="1024x1024", n=1),
+                    priority=priority,
+                )
+                span.set(images=1, cost_usd=llm_cost("dall-e-3", images=1))
             return response.data[0].url
         except Exception as e:
             print(f"An error occurred during image creation: {e}")
@@ -136,10 +261,9 @@ class ShadowAgent:
 
             if self.xp >= xp_needed:
                 # If XP is sufficient for the NEXT rank, then promote
-                previous_rank = self.rank
                 self.rank = next_rank
                 print(f"🎉 **RANK UP!** Agent {self.agent_id} has been promoted to {self.rank} Rank! 🎉")
-                self.check_for_class_advancement(previous_rank)
+                self.check_for_class_advancement()
                 self.update_config()
             else:
                 # If XP is not enough for the next rank, stop checking
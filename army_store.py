@@ -0,0 +1,131 @@
+# army_store.py
+import json
+import os
+import sqlite3
+import threading
+
+
+def open_army_store(path):
+    """Picks the store for a path: ".json" files use the original format, anything else SQLite."""
+    if path.endswith(".json"):
+        return JsonArmyStore(path)
+    return SQLiteArmyStore(path)
+
+
+def _id_number(agent_id):
+    """The numeric suffix of ids like "R-007", or 0 for ids that don't follow that pattern."""
+    try:
+        return int(agent_id.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+class JsonArmyStore:
+    """
+    The original army.json format: {agent_id: {"agent_id", "rank", "specialty", "xp"}}.
+    The file is read once and rewritten atomically (only when something changed), so a crash
+    mid-write can never leave a truncated army behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._records = {}
+        try:
+            with open(path, 'r') as f:
+                content = f.read()
+            if content:
+                self._records = json.loads(content)
+        except FileNotFoundError:
+            print("No existing army file found. Starting with a new army.")
+
+    def count(self):
+        return len(self._records)
+
+    def contains(self, agent_id):
+        return agent_id in self._records
+
+    def max_id_number(self, prefix):
+        return max((_id_number(agent_id) for agent_id in self._records if agent_id.startswith(prefix)), default=0)
+
+    def load(self, specialty=None):
+        """Returns agent records, optionally only those of one specialty."""
+        return [dict(record) for record in self._records.values()
+                if specialty is None or record["specialty"] == specialty]
+
+    def save(self, records):
+        """Updates the given agent records and rewrites the file."""
+        if not records:
+            return
+        for record in records:
+            self._records[record["agent_id"]] = dict(record)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self._records, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        pass
+
+
+class SQLiteArmyStore:
+    """
+    Stores one row per agent, so saving writes only the agents that changed and loading can
+    fetch a single specialty. Every save is its own transaction, so progress survives a crash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS agents ("
+            "agent_id TEXT PRIMARY KEY, specialty TEXT NOT NULL, rank TEXT NOT NULL, xp INTEGER NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS agents_specialty ON agents (specialty)")
+        self._connection.commit()
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM agents").fetchone()[0]
+
+    def contains(self, agent_id):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT 1 FROM agents WHERE agent_id = ?", (agent_id,)).fetchone() is not None
+
+    def max_id_number(self, prefix):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT agent_id FROM agents WHERE substr(agent_id, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+        return max((_id_number(row[0]) for row in rows), default=0)
+
+    def load(self, specialty=None):
+        """Returns agent records, optionally only those of one specialty."""
+        query = "SELECT agent_id, specialty, rank, xp FROM agents"
+        params = ()
+        if specialty is not None:
+            query += " WHERE specialty = ?"
+            params = (specialty,)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [{"agent_id": row[0], "rank": row[2], "specialty": row[1], "xp": row[3]} for row in rows]
+
+    def save(self, records):
+        """Upserts the given agent records in a single transaction."""
+        if not records:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO agents (agent_id, specialty, rank, xp) VALUES (:agent_id, :specialty, :rank, :xp) "
+                "ON CONFLICT(agent_id) DO UPDATE SET specialty = excluded.specialty, rank = excluded.rank, xp = excluded.xp",
+                records,
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
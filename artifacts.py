@@ -0,0 +1,156 @@
+# artifacts.py
+import hashlib
+import mmap
+import os
+import shutil
+import threading
+import weakref
+from cache import CACHE_DIR
+
+# Where large artifacts are written, in one subdirectory per process. Files are named by content hash
+# and deleted once no running job holds them; a dead process's subdirectory is removed by the next one.
+ARTIFACT_DIR = os.environ.get("MONARCH_ARTIFACT_DIR", os.path.join(CACHE_DIR, "artifacts"))
+# Artifacts up to this many bytes (UTF-8) stay in memory; bigger ones go to disk.
+SPILL_THRESHOLD = 64 * 1024
+
+
+class SpilledArtifact:
+    """
+    A large artifact kept on disk. The text is read back through a memory map only when it is
+    needed (`str(artifact)`), so a job holding many large artifacts holds only their handles.
+    """
+
+    def __init__(self, path, digest, length):
+        self.path = path
+        self.digest = digest
+        self.length = length  # In characters, like len() of the text.
+
+    def __str__(self):
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return str(data, "utf-8")
+
+    def __len__(self):
+        return self.length
+
+    def head(self, chars):
+        """The first `chars` characters, reading only the start of the file."""
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # A UTF-8 character is at most 4 bytes; a character cut in half at the end is dropped.
+            return data[:chars * 4].decode("utf-8", errors="ignore")[:chars]
+
+    def paragraphs(self):
+        """Yields the text's paragraphs (split on blank lines), decoding one at a time."""
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while True:
+                end = data.find(b"\n\n", start)
+                if end == -1:
+                    yield str(data[start:], "utf-8")
+                    return
+                yield str(data[start:end], "utf-8")
+                start = end + 2
+
+
+def preview(artifact, chars=100):
+    """A short summary of an artifact for logs and job history."""
+    text = artifact.head(chars) if isinstance(artifact, SpilledArtifact) else artifact[:chars]
+    return text + '...' if len(artifact) > chars else text
+
+
+def paragraphs(artifact):
+    """An artifact's paragraphs; a spilled artifact is read piece by piece instead of all at once."""
+    return artifact.paragraphs() if isinstance(artifact, SpilledArtifact) else artifact.split("\n\n")
+
+
+class ArtifactStore:
+    """
+    Keeps step outputs for running jobs. Small artifacts stay as plain strings; larger ones are
+    written once to a content-addressed file, so identical outputs from different jobs share one
+    file and one handle, and a job's memory use doesn't grow with artifact size. Each put() of a
+    large artifact must be matched by a release() once the job is done with it; the file is
+    deleted when the last job releases it. Every process writes to its own subdirectory, so it
+    never deletes a file another process is still reading.
+    """
+
+    def __init__(self, directory=ARTIFACT_DIR, spill_threshold=SPILL_THRESHOLD):
+        self.directory = directory
+        self.spill_threshold = spill_threshold
+        self.spilled = 0
+        self.deduplicated = 0
+        self.removed = 0
+        self._handles = weakref.WeakValueDictionary()  # digest -> live SpilledArtifact
+        self._refs = {}  # digest -> number of puts not yet released
+        self._orphans_removed = False
+        self._lock = threading.Lock()
+
+    def put(self, text):
+        """Stores an artifact and returns what the job should keep: the string itself or a disk handle."""
+        if not isinstance(text, str) or len(text) * 4 <= self.spill_threshold:
+            return text  # Too small to spill whatever its encoding (or not text at all).
+        data = text.encode("utf-8")
+        if len(data) <= self.spill_threshold:
+            return text
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+            handle = self._handles.get(digest)
+            if handle is not None:
+                self.deduplicated += 1
+                return handle
+            if not self._orphans_removed:
+                self._remove_orphans()
+            path = os.path.join(self.directory, str(os.getpid()), digest[:2], digest)
+            if os.path.exists(path):
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.spilled += 1
+            handle = SpilledArtifact(path, digest, len(text))
+            self._handles[digest] = handle
+            return handle
+
+    def _remove_orphans(self):
+        """Deletes the subdirectories of processes that are no longer running (say, after a crash)."""
+        self._orphans_removed = True
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.isdigit() or int(name) == os.getpid():
+                continue
+            try:
+                os.kill(int(name), 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            except PermissionError:
+                pass  # Alive, but owned by another user.
+
+    def release(self, artifacts):
+        """Gives back artifacts returned by put(); spilled files no other job holds are deleted."""
+        for artifact in artifacts:
+            if not isinstance(artifact, SpilledArtifact):
+                continue
+            with self._lock:
+                refs = self._refs.get(artifact.digest, 0) - 1
+                if refs > 0:
+                    self._refs[artifact.digest] = refs
+                    continue
+                self._refs.pop(artifact.digest, None)
+                self._handles.pop(artifact.digest, None)
+                try:
+                    os.remove(artifact.path)
+                    self.removed += 1
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        return {"spilled": self.spilled, "deduplicated": self.deduplicated, "removed": self.removed}
+
+
+# The store shared by every job in this process.
+artifact_store = ArtifactStore()
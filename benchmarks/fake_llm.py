@@ -0,0 +1,206 @@
+# benchmarks/fake_llm.py
+"""
+A local stand-in for the OpenAI API, for benchmarks that must not spend money or need a network.
+
+Serves `/v1/chat/completions` (plain and streamed, with usage) and `/v1/images/generations`
+with configurable latency, answer length and error rate. Use it in-process:
+
+    with FakeLLMServer(latency=0.05, tokens=200) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+or run it standalone and point Monarch at it:
+
+    python benchmarks/fake_llm.py --port 8000 --latency 0.2 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=fake monarch "..."
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("monarch shadow guild agent artifact draft review plan code image budget rank "
+         "memory quest dungeon report outline summary detail result").split()
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Answers every completion with `tokens` words after `latency` seconds (streamed answers
+    spread `token_latency` seconds between words). A fraction `error_rate` of requests fail
+    with HTTP 429 and a short Retry-After, which exercises the request scheduler's retries.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, tokens=50, token_latency=0.0, error_rate=0.0,
+                 seed=None):
+        super().__init__((host, port), _FakeLLMHandler)
+        self.latency = latency
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.first_call = None
+        self.first_call_event = threading.Event()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record_request(self):
+        """Counts a request and decides whether it should fail."""
+        with self._lock:
+            if self.first_call is None:
+                self.first_call = time.perf_counter()
+                self.first_call_event.set()
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def stats(self):
+        return {"requests": self.requests, "errors": self.errors}
+
+
+class _FakeLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith(("/chat/completions", "/images/generations")):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        if self.server.record_request():
+            self._send_json(429, {"error": {"message": "Fake rate limit.", "type": "rate_limit_error"}},
+                            {"retry-after": "0.05"})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.path.endswith("/images/generations"):
+            digest = hashlib.sha256(request.get("prompt", "").encode("utf-8")).hexdigest()[:16]
+            self._send_json(200, {"created": int(time.time()),
+                                  "data": [{"url": f"https://images.invalid/{digest}.png"}]})
+        elif request.get("stream"):
+            self._stream_completion(request)
+        else:
+            self._send_json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(self._answer(request))}}],
+                "usage": self._usage(request),
+            })
+
+    def _answer(self, request):
+        # Seeded by the prompt so the same request always gets the same answer.
+        seed = int(hashlib.sha256(json.dumps(request.get("messages", [])).encode("utf-8")).hexdigest()[:8], 16)
+        return [WORDS[(seed + i * 7) % len(WORDS)] for i in range(self.server.tokens)]
+
+    def _usage(self, request):
+        prompt_tokens = math.ceil(len(json.dumps(request.get("messages", []))) / 4)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": self.server.tokens,
+                "total_tokens": prompt_tokens + self.server.tokens}
+
+    def _stream_completion(self, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o")}
+        for i, word in enumerate(self._answer(request)):
+            if i and self.server.token_latency:
+                time.sleep(self.server.token_latency)
+            delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+            self._send_event({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        self._send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**base, "choices": [], "usage": self._usage(request)})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HashEmbeddingFunction:
+    """
+    An offline stand-in for the ChromaDB embedding model: hashed bag-of-words vectors.
+    Similar texts still land close together, which is all the memory benchmarks need.
+    """
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def __call__(self, input):
+        embeddings = []
+        for text in input:
+            vector = [0.0] * self.dimensions
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0 if digest[4] & 1 else -1.0
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            embeddings.append([x / norm for x in vector])
+        return embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI API server for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response starts.")
+    parser.add_argument("--tokens", type=int, default=50, help="Words in each completion.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed words.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--seed", type=int, help="Seed for the error sampling.")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, args.latency, args.tokens, args.token_latency, args.error_rate,
+                           args.seed)
+    print(f"Fake LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/harness.py
+"""Shared set-up and reporting for the offline benchmarks."""
+import contextlib
+import json
+import math
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUILDS_FILE = os.path.join(REPO_ROOT, "guilds.json")
+
+
+@contextlib.contextmanager
+def offline_workdir(base_url=None):
+    """
+    A throwaway directory for the army, response cache and memory, with search on offline
+    fixtures and (when `base_url` is given) OpenAI pointed at a fake server. Set up before
+    importing Monarch, because some settings are read at import time.
+    """
+    workdir = tempfile.mkdtemp(prefix="monarch-bench-")
+    os.environ.update(MONARCH_CACHE_DIR=os.path.join(workdir, "cache"),
+                      MONARCH_MEMORY_DIR=os.path.join(workdir, "memory"),
+                      MONARCH_SEARCH_BACKEND="fixture")
+    if base_url:
+        os.environ.update(OPENAI_BASE_URL=base_url, OPENAI_API_KEY="offline-benchmark")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    try:
+        yield workdir
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def use_offline_embeddings():
+    """Swaps the memory module's embedding model for hashed bag-of-words vectors (no model download)."""
+    import memory
+    from fake_llm import HashEmbeddingFunction
+    memory._embedding_function = HashEmbeddingFunction()
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silences the agents' progress prints so they don't dominate the timings."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize_ms(timings):
+    """Summarizes timings given in seconds, reported in milliseconds."""
+    if not timings:
+        return {"count": 0}
+    return {
+        "count": len(timings),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+    }
+
+
+def time_calls(fn, arguments):
+    """Calls `fn` once per argument and returns each call's duration in seconds."""
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        fn(argument)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def report(name, results):
+    """Prints results as JSON, tagged with the benchmark name and Python version."""
+    print(json.dumps({"benchmark": name, "python": sys.version.split()[0], **results}, indent=2))
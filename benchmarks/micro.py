@@ -0,0 +1,144 @@
+# benchmarks/micro.py
+"""
+Micro-benchmarks for Monarch's own bookkeeping, with no LLM calls at all:
+  - guild routing (`_determine_guild`)
+  - agent selection from a large army (`_get_agent` / `_release_agent`)
+  - loading and saving the army (`_load_army` plus lazy loading, `save_army`)
+  - memory recall at scale (`memorize`/`flush` and `recall`, with offline embeddings)
+
+    python benchmarks/micro.py --army-size 20000 --memories 5000 > micro.json
+"""
+import argparse
+import os
+import random
+import time
+
+from harness import GUILDS_FILE, offline_workdir, use_offline_embeddings, quiet, summarize_ms, time_calls, \
+    peak_rss_mb, report
+
+SAMPLE_PROMPTS = [
+    "Write a blog post about black holes.",
+    "Create a python class for a snake game, including a plan, the code, and a final review.",
+    "Draw a watercolor illustration of a lighthouse at dusk.",
+    "Debug this function and explain the fix.",
+    "Summarize the history of the printing press.",
+    "Design a logo for a coffee shop and a short brand story.",
+    "Plan a three day trip to Kyoto.",
+]
+
+
+def build_army(monarch_controller, size, seed=0):
+    """Writes `size` agents spread over every specialty straight into the store."""
+    from agent import RANK_XP_THRESHOLDS, rank_for_xp
+    rng = random.Random(seed)
+    specialties = sorted(monarch_controller.specialty_guilds)
+    max_xp = RANK_XP_THRESHOLDS["S"] + 500
+    records = []
+    for number in range(1, size + 1):
+        specialty = specialties[number % len(specialties)]
+        xp = int(rng.random() ** 2 * max_xp)  # Skewed towards low ranks, like a real army.
+        records.append({"agent_id": f"{specialty[0]}-{number:06d}", "rank": rank_for_xp(xp),
+                        "specialty": specialty, "xp": xp})
+    monarch_controller.store.save(records)
+    return records
+
+
+def bench_routing(monarch_controller, iterations):
+    prompts = [SAMPLE_PROMPTS[i % len(SAMPLE_PROMPTS)] for i in range(iterations)]
+    return summarize_ms(time_calls(monarch_controller._determine_guild, prompts))
+
+
+def bench_get_agent(monarch_controller, iterations):
+    """Cold call (loads the specialty) and warm acquire/release cycles at several minimum ranks."""
+    specialty = "Researcher"
+    guild_config = monarch_controller.specialty_guilds[specialty]
+    start = time.perf_counter()
+    agent = monarch_controller._get_agent(specialty, guild_config, "F")
+    cold = time.perf_counter() - start
+    monarch_controller._release_agent(agent)
+
+    def cycle(min_rank):
+        agent = monarch_controller._get_agent(specialty, guild_config, min_rank)
+        if agent:
+            monarch_controller._release_agent(agent)
+
+    ranks = ["F", "D", "B", "S"]
+    warm = time_calls(cycle, [ranks[i % len(ranks)] for i in range(iterations)])
+    return {"cold_ms": round(cold * 1000, 3), "warm": summarize_ms(warm)}
+
+
+def bench_load_save(army_file, dirty_fraction=0.01):
+    """Time to open the store and load every specialty, then to save a few changed agents and the whole army."""
+    from monarch import Monarch
+    start = time.perf_counter()
+    monarch_controller = Monarch(army_file=army_file, guild_config_file=GUILDS_FILE)
+    opened = time.perf_counter() - start
+    for specialty in monarch_controller.specialty_guilds:
+        monarch_controller._ensure_loaded(specialty)
+    loaded = time.perf_counter() - start
+
+    agent_ids = list(monarch_controller.army)
+    monarch_controller._dirty_agents.update(agent_ids[:max(1, int(len(agent_ids) * dirty_fraction))])
+    start = time.perf_counter()
+    monarch_controller.save_army()
+    incremental = time.perf_counter() - start
+
+    monarch_controller._dirty_agents.update(agent_ids)
+    start = time.perf_counter()
+    monarch_controller.save_army()
+    full = time.perf_counter() - start
+    return {"agents": len(agent_ids), "open_ms": round(opened * 1000, 3), "load_all_ms": round(loaded * 1000, 3),
+            f"save_{dirty_fraction:.0%}_dirty_ms": round(incremental * 1000, 3), "save_all_ms": round(full * 1000, 3)}
+
+
+def bench_recall(memories, iterations, seed=0):
+    try:
+        import chromadb  # noqa: F401
+    except ImportError:
+        return {"skipped": "chromadb is not installed"}
+    import memory
+    use_offline_embeddings()
+    rng = random.Random(seed)
+
+    def document(number):
+        words = " ".join(rng.choice(SAMPLE_PROMPTS).split()[:6])
+        return f"Deliverable {number}: {words} with notes on item {rng.randrange(10 ** 6)}."
+
+    start = time.perf_counter()
+    for number in range(memories):
+        memory.memorize(job_id=f"bench-{number}", content=document(number))
+    memory.flush()
+    stored = time.perf_counter() - start
+
+    queries = [document(-i) for i in range(iterations)]
+    cold = time_calls(memory.recall, queries)
+    warm = time_calls(memory.recall, queries)  # The same queries again, now answered by the recall cache.
+    return {"memories": memories, "memorize_flush_ms": round(stored * 1000, 3),
+            "recall_cold": summarize_ms(cold), "recall_cached": summarize_ms(warm)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for Monarch's routing, roster, storage and memory.")
+    parser.add_argument("--army-size", type=int, default=10000, help="Agents in the benchmark army.")
+    parser.add_argument("--memories", type=int, default=2000, help="Documents stored before timing recall.")
+    parser.add_argument("--iterations", type=int, default=1000, help="Timed calls per benchmark.")
+    args = parser.parse_args()
+
+    with offline_workdir() as workdir, quiet():
+        from monarch import Monarch
+        army_file = os.path.join(workdir, "army.db")
+        monarch_controller = Monarch(army_file=army_file, guild_config_file=GUILDS_FILE)
+        build_army(monarch_controller, args.army_size)
+        results = {
+            "config": {"army_size": args.army_size, "memories": args.memories, "iterations": args.iterations},
+            "determine_guild": bench_routing(monarch_controller, args.iterations),
+            "get_agent": bench_get_agent(monarch_controller, args.iterations),
+            "load_save_army": bench_load_save(army_file),
+            "recall": bench_recall(args.memories, min(args.iterations, 200)),
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+    report("micro", results)
+
+
+if __name__ == "__main__":
+    main()
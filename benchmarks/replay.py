@@ -0,0 +1,96 @@
+# benchmarks/replay.py
+"""
+Replays a prompt corpus through Monarch.execute_job against the fake LLM server.
+
+Each corpus line is a JSON string or an object with a "prompt" (or "title"/"body", as in
+requests.jsonl). Reports jobs/sec, per-job latency percentiles, LLM requests and peak memory:
+    python benchmarks/replay.py requests.jsonl --concurrency 8 --latency 0.05 > replay.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_llm import FakeLLMServer
+from harness import (GUILDS_FILE, REPO_ROOT, offline_workdir, use_offline_embeddings, quiet, summarize_ms,
+                     peak_rss_mb, report)
+
+
+def read_corpus(path, limit=None):
+    prompts = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                prompts.append(item)
+            else:
+                prompts.append(item.get("prompt") or " ".join(filter(None, [item.get("title"), item.get("body")])))
+            if limit and len(prompts) >= limit:
+                break
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a prompt corpus through Monarch, offline.")
+    parser.add_argument("corpus", nargs="?", default=os.path.join(REPO_ROOT, "requests.jsonl"),
+                        help="JSONL prompt corpus (default: requests.jsonl).")
+    parser.add_argument("--limit", type=int, help="Replay at most this many prompts.")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus this many times.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs running at the same time.")
+    parser.add_argument("--budget", type=int, default=200, help="Budget for each job.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake server latency per request, seconds.")
+    parser.add_argument("--tokens", type=int, default=100, help="Words in each fake completion.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake requests that get a 429.")
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM response cache on (off by default).")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="Keep the scheduler's rate limits (by default they are lifted to measure overhead).")
+    args = parser.parse_args()
+
+    prompts = read_corpus(args.corpus, args.limit) * args.repeat
+    with FakeLLMServer(latency=args.latency, tokens=args.tokens, error_rate=args.error_rate, seed=0) as server, \
+            offline_workdir(server.base_url) as workdir:
+        with quiet():
+            from cache import response_cache
+            from scheduler import request_scheduler
+            from monarch import Monarch
+            use_offline_embeddings()
+            if not args.cache:
+                response_cache.mode = "off"
+            if not args.rate_limits:
+                request_scheduler.limits = {}
+            monarch_controller = Monarch(army_file=os.path.join(workdir, "army.db"), guild_config_file=GUILDS_FILE)
+
+        def run_job(prompt):
+            start = time.perf_counter()
+            final_product, _, _ = monarch_controller.execute_job(prompt, budget=args.budget)
+            return time.perf_counter() - start, bool(final_product)
+
+        with quiet():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                outcomes = list(executor.map(run_job, prompts))
+            wall = time.perf_counter() - start
+            monarch_controller.save_army()
+
+        latencies = [latency for latency, _ in outcomes]
+        report("replay", {
+            "config": {"corpus": os.path.basename(args.corpus), "jobs": len(prompts), "concurrency": args.concurrency,
+                       "latency_s": args.latency, "tokens": args.tokens, "error_rate": args.error_rate,
+                       "cache": args.cache, "rate_limits": args.rate_limits},
+            "completed": sum(1 for _, ok in outcomes if ok),
+            "failed": sum(1 for _, ok in outcomes if not ok),
+            "wall_s": round(wall, 3),
+            "jobs_per_sec": round(len(prompts) / wall, 3) if wall else None,
+            "job_latency": summarize_ms(latencies),
+            "llm": {**server.stats(), "scheduler_retries": request_scheduler.retries},
+            "army_size": len(monarch_controller.army),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+
+
+if __name__ == "__main__":
+    main()
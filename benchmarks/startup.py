@@ -0,0 +1,94 @@
+# benchmarks/startup.py
+"""
+Startup benchmark for the Monarch CLI.
+
+Measures two things, each over several fresh processes:
+  - how long `main.py --help` takes to return
+  - time-to-first-LLM-call: from process start until the first chat completion request
+    reaches a local stand-in for the OpenAI API (no API key or network needed)
+
+Results are printed as JSON so they can be tracked over time:
+    python benchmarks/startup.py --runs 10 > startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_llm import FakeLLMServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(REPO_ROOT, "main.py")
+
+
+def time_help(runs):
+    """Wall time of `main.py --help` in fresh processes."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, "--help"], check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_first_llm_call(runs, timeout):
+    """Seconds from process start until the first chat completion request arrives."""
+    timings = []
+    for _ in range(runs):
+        server = FakeLLMServer(tokens=1).start()
+        workdir = tempfile.mkdtemp(prefix="monarch-startup-")
+        shutil.copy(os.path.join(REPO_ROOT, "guilds.json"), workdir)
+        env = dict(os.environ,
+                   OPENAI_BASE_URL=server.base_url,
+                   OPENAI_API_KEY="startup-benchmark",
+                   MONARCH_CACHE_DIR=os.path.join(workdir, "cache"),
+                   MONARCH_MEMORY_DIR=os.path.join(workdir, "memory"))
+        process = None
+        try:
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable, MAIN, "--no-cache", "Write a one line summary of startup."],
+                                       cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if server.first_call_event.wait(timeout):
+                timings.append(server.first_call - start)
+            process.wait(timeout)
+        finally:
+            if process is not None and process.poll() is None:
+                process.kill()
+            server.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+    return timings
+
+
+def summarize(timings):
+    if not timings:
+        return {"runs": 0}
+    return {
+        "runs": len(timings),
+        "min_ms": round(min(timings) * 1000, 2),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "max_ms": round(max(timings) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Monarch CLI startup.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement (default: 5).")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for each job run.")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "help": summarize(time_help(args.runs)),
+        "first_llm_call": summarize(time_first_llm_call(args.runs, args.timeout)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
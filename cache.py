@@ -0,0 +1,146 @@
+# cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("MONARCH_CACHE_DIR", ".monarch_cache")
+# Writes between full recounts of the cache's size (which also pick up writes by other processes).
+RECOUNT_INTERVAL = 1000
+
+
+class ResponseCache:
+    """
+    A disk-backed cache for LLM responses, keyed by a hash of the full request.
+    Entries are evicted least-recently-used first once the cache grows past `max_entries`
+    or `max_bytes`, and entries older than `ttl` seconds (if set) are treated as misses.
+
+    `mode` controls how the cache is used:
+      "on"      - read and write the cache (default)
+      "refresh" - ignore cached entries but store fresh responses
+      "off"     - bypass the cache entirely
+    """
+
+    def __init__(self, path=None, max_entries=10000, max_bytes=200 * 1024 * 1024, ttl=None):
+        self.path = path or os.path.join(CACHE_DIR, "responses.db")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.mode = "on"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None  # Opened on first use so importing the cache never touches disk.
+        self._size = None  # [entries, bytes], kept up to date by each write between recounts.
+        self._writes = 0
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_age ON responses (created_at)")
+        return self._connection
+
+    @staticmethod
+    def make_key(request):
+        """Hashes a request (model, messages and every other parameter) into a stable cache key."""
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss."""
+        if self.mode != "on":
+            return None
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        """Stores a JSON-serializable value under `key` and evicts old entries if the cache is full."""
+        if self.mode == "off":
+            return
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            replaced = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            if replaced:
+                self._evict(connection, 0, len(payload) - replaced[0])
+            else:
+                self._evict(connection, 1, len(payload))
+
+    def _evict(self, connection, added_entries, added_bytes):
+        """
+        Deletes expired entries, then least recently used ones while the cache is over its limits.
+        The size is tracked from each write's `added_entries` and `added_bytes` and only counted
+        in full every RECOUNT_INTERVAL writes.
+        """
+        if self._size is None or self._writes >= RECOUNT_INTERVAL:
+            self._size = list(connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone())
+            self._writes = 0
+        else:
+            self._size[0] += added_entries
+            self._size[1] += added_bytes
+        self._writes += 1
+        count, total_bytes = self._size
+        if self.ttl is not None:
+            cutoff = time.time() - self.ttl
+            expired, expired_bytes = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (cutoff,)).fetchone()
+            if expired:
+                connection.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+                count -= expired
+                total_bytes -= expired_bytes
+        while count > self.max_entries or total_bytes > self.max_bytes:
+            # Drop the least recently used tenth (at least one entry) per pass.
+            batch = max(1, count // 10)
+            rows = connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT ?", (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            connection.executemany("DELETE FROM responses WHERE key = ?", [(row[0],) for row in rows])
+            count -= len(rows)
+            total_bytes -= sum(row[1] for row in rows)
+        self._size = [count, total_bytes]
+
+    def clear(self):
+        """Removes every cached response."""
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+            self._size = [0, 0]
+
+    def stats(self):
+        """Returns the hit/miss counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# The shared cache used by every agent.
+response_cache = ResponseCache()
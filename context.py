@@ -0,0 +1,113 @@
+# context.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Most tokens a step's prompt (task plus recalled memories) may use; longer inputs are split into chunks.
+MAX_PROMPT_TOKENS = int(os.environ.get("MONARCH_MAX_PROMPT_TOKENS", 16000))
+# Most tokens of recalled memories added to a prompt.
+MAX_MEMORY_TOKENS = 2000
+# Memories that would be cut shorter than this are dropped instead.
+MIN_MEMORY_TOKENS = 50
+# Agents of the same role that may work on the chunks of one oversized step.
+MAX_CHUNK_AGENTS = 4
+# Token counts of recently seen texts (memories and artifacts are counted more than once).
+COUNT_CACHE_SIZE = 4096
+
+_count_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    """The tokenizer for a model, loaded once; None when tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Counts tokens exactly with tiktoken, or estimates about four characters per token without it."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    key = (model, hashlib.sha1(text.encode("utf-8")).digest())
+    with _lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            return _count_cache[key]
+    count = len(encoding.encode(text, disallowed_special=()))
+    with _lock:
+        _count_cache[key] = count
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return count
+
+
+def truncate_tokens(text, max_tokens, model="gpt-4o"):
+    """The start of `text`, at most `max_tokens` long."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def fit_memories(memories, max_tokens, model="gpt-4o"):
+    """
+    Keeps recalled memories, most relevant first, within `max_tokens`.
+    The last one that fits only partly is cut short; anything after it is dropped.
+    """
+    kept = []
+    remaining = max_tokens
+    for memory in memories:
+        tokens = count_tokens(memory, model)
+        if tokens <= remaining:
+            kept.append(memory)
+            remaining -= tokens
+            continue
+        if remaining >= MIN_MEMORY_TOKENS:
+            kept.append(truncate_tokens(memory, remaining, model) + " [...]")
+        break
+    return kept
+
+
+def _split_tokens(text, max_tokens, model):
+    """Cuts text into consecutive pieces of exactly `max_tokens` (the last may be shorter)."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        size = max_tokens * 4
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def split_into_chunks(text, max_tokens, model="gpt-4o"):
+    """
+    Splits text (or an iterable of its paragraphs) into pieces of at most `max_tokens`, breaking
+    between paragraphs where possible and inside a paragraph only when it is longer than a whole chunk.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n\n") if isinstance(text, str) else text:
+        tokens = count_tokens(paragraph, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        if tokens > max_tokens:
+            pieces = _split_tokens(paragraph, max_tokens, model)
+            chunks.extend(pieces[:-1])
+            paragraph = pieces[-1]
+            tokens = count_tokens(paragraph, model)
+        if paragraph:
+            current.append(paragraph)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
@@ -0,0 +1,119 @@
+# job_cache.py
+import hashlib
+import threading
+import time
+from memory import embed, open_collection
+
+# Similarity (1 - cosine distance between request embeddings) at or above which a past
+# deliverable is returned as is, and the lower bar at which it is only polished by the final step.
+HIT_THRESHOLD = 0.95
+POLISH_THRESHOLD = 0.85
+
+
+class JobCache:
+    """
+    Remembers finished deliverables keyed by the embedding of the request that produced them.
+    A new request to the same guild that is close enough to a past one can reuse its deliverable
+    ("hit") or have it adapted by the workflow's final step alone ("polish") instead of running
+    the whole workflow. Deliverables older than `ttl` seconds (if set) are ignored. Off until
+    `enabled` is set.
+    """
+
+    def __init__(self, hit_threshold=HIT_THRESHOLD, polish_threshold=POLISH_THRESHOLD, enabled=False, ttl=None):
+        self.hit_threshold = hit_threshold
+        self.polish_threshold = polish_threshold
+        self.enabled = enabled
+        self.ttl = ttl
+        self.hits = 0
+        self.polished = 0
+        self.misses = 0
+        # Best similarity found per lookup, kept as running totals so a long-running server doesn't grow.
+        self.similarity_count = 0
+        self.similarity_sum = 0.0
+        self.similarity_max = None
+        self._collection = None
+        self._lock = threading.Lock()
+
+    def _get_collection(self):
+        if self._collection is None:
+            self._collection = open_collection('project_monarch_deliverables')
+        return self._collection
+
+    def lookup(self, user_request, guild_name):
+        """
+        Returns (outcome, similarity, match) where outcome is "hit", "polish" or "miss" and match
+        is {"request", "result", "job_id", "created_at"} for the closest past deliverable of this
+        guild that is still within the TTL (or None). A "polish" is only counted once the caller
+        reports how it went with record_polish().
+        """
+        match, similarity = None, None
+        where = {"guild": guild_name}
+        if self.ttl is not None:
+            where = {"$and": [where, {"created_at": {"$gte": time.time() - self.ttl}}]}
+        try:
+            collection = self._get_collection()
+            if collection.count():
+                nearest = collection.query(query_embeddings=embed([user_request]), n_results=1, where=where,
+                                           include=["documents", "metadatas", "distances"])
+                if nearest["documents"] and nearest["documents"][0]:
+                    similarity = 1.0 - nearest["distances"][0][0]
+                    metadata = nearest["metadatas"][0][0]
+                    match = {"request": metadata.get("request", ""), "result": nearest["documents"][0][0],
+                             "job_id": metadata.get("job_id"), "created_at": metadata.get("created_at")}
+        except Exception as e:
+            print(f"Job cache lookup failed: {e}")
+
+        if similarity is not None and similarity >= self.hit_threshold:
+            outcome = "hit"
+        elif similarity is not None and similarity >= self.polish_threshold:
+            outcome = "polish"
+        else:
+            outcome = "miss"
+        with self._lock:
+            if similarity is not None:
+                self.similarity_count += 1
+                self.similarity_sum += similarity
+                self.similarity_max = similarity if self.similarity_max is None else max(self.similarity_max, similarity)
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "miss":
+                self.misses += 1
+        return outcome, similarity, match
+
+    def record_polish(self, succeeded):
+        """Counts a "polish" lookup as polished, or as a miss when the full workflow had to run after all."""
+        with self._lock:
+            if succeeded:
+                self.polished += 1
+            else:
+                self.misses += 1
+
+    def store(self, user_request, guild_name, result, job_id):
+        """
+        Records a deliverable under its request (a repeated request replaces the older one). Only
+        deliverables of a fully successful workflow belong here, not failed or best-effort ones.
+        """
+        try:
+            key = hashlib.sha256(f"{guild_name}\n{user_request}".encode("utf-8")).hexdigest()
+            self._get_collection().upsert(
+                ids=[key], embeddings=embed([user_request]), documents=[result],
+                metadatas=[{"guild": guild_name, "request": user_request, "job_id": str(job_id),
+                            "created_at": time.time()}])
+        except Exception as e:
+            print(f"Job cache store failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.polished + self.misses
+            return {
+                "hits": self.hits,
+                "polished": self.polished,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.polished) / lookups if lookups else 0.0,
+                "mean_similarity": self.similarity_sum / self.similarity_count if self.similarity_count else None,
+                "max_similarity": self.similarity_max,
+            }
+
+
+# The job cache shared by every Monarch in this process, configured by main.py.
+job_cache = JobCache()
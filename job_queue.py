@@ -0,0 +1,138 @@
+# job_queue.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Statuses a queued job moves through. Finished jobs keep their result until pruned.
+QUEUED, RUNNING, COMPLETED, FAILED = "QUEUED", "RUNNING", "COMPLETED", "FAILED"
+# Finished jobs are pruned once they are this many seconds old, or when more than this many are kept.
+JOB_RETENTION = 7 * 24 * 3600
+MAX_FINISHED_JOBS = 10000
+
+
+def job_error(prompt, budget):
+    """Why a job with this prompt and budget can't run, or None if it can."""
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "Job has no \"prompt\" string."
+    if not isinstance(budget, int) or isinstance(budget, bool) or budget < 0:
+        return "Job \"budget\" must be a non-negative integer."
+    return None
+
+
+class JobQueue:
+    """
+    A first-in, first-out job queue kept in SQLite, so submitted jobs and their results survive
+    a restart of the server. Jobs that were running when the process stopped are queued again
+    when it starts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, seq INTEGER NOT NULL, prompt TEXT NOT NULL, budget INTEGER NOT NULL, "
+            "status TEXT NOT NULL, result TEXT, history TEXT, error TEXT, "
+            "submitted_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+        with self._connection:
+            requeued = self._connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING)).rowcount
+        if requeued:
+            print(f"Job queue: re-queued {requeued} jobs that were interrupted.")
+
+    def submit(self, prompt, budget=200):
+        """Adds a job and returns its id."""
+        job_id = uuid.uuid4().hex[:12]
+        with self._available, self._connection:
+            seq = self._connection.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs").fetchone()[0]
+            self._connection.execute(
+                "INSERT INTO jobs (id, seq, prompt, budget, status, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, seq, prompt, budget, QUEUED, time.time()))
+            self._available.notify()
+        return job_id
+
+    def claim(self, timeout=None):
+        """Marks the oldest queued job as running and returns it, waiting up to `timeout` seconds for one."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._available:
+            while True:
+                row = self._connection.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY seq LIMIT 1", (QUEUED,)).fetchone()
+                if row:
+                    with self._connection:
+                        self._connection.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                                                 (RUNNING, time.time(), row[0]))
+                    return self._get(row[0])
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._available.wait(remaining)
+
+    def finish(self, job_id, result, history, error=None):
+        """Records a job's outcome; it is COMPLETED if it produced a result and FAILED otherwise."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, history = ?, error = ?, finished_at = ? WHERE id = ?",
+                (COMPLETED if result else FAILED, result, json.dumps(history or []), error, time.time(), job_id))
+
+    def get(self, job_id):
+        """The job as a dict, or None if there is no such job."""
+        with self._lock:
+            return self._get(job_id)
+
+    def _get(self, job_id):
+        row = self._connection.execute(
+            "SELECT id, prompt, budget, status, result, history, error, submitted_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "prompt", "budget", "status", "result", "history", "error",
+                "submitted_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        job["history"] = json.loads(job["history"]) if job["history"] else []
+        return job
+
+    def counts(self):
+        """How many jobs are in each status."""
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in (QUEUED, RUNNING, COMPLETED, FAILED)} | dict(rows)
+
+    def prune(self, max_age=JOB_RETENTION, max_finished=MAX_FINISHED_JOBS):
+        """
+        Deletes finished jobs older than `max_age` seconds, then the oldest beyond the newest
+        `max_finished`. Queued and running jobs are never pruned. Returns how many were deleted.
+        """
+        with self._lock, self._connection:
+            deleted = 0
+            if max_age is not None:
+                deleted += self._connection.execute(
+                    "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                    (time.time() - max_age,)).rowcount
+            if max_finished is not None:
+                deleted += self._connection.execute(
+                    "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL "
+                    "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)", (max_finished,)).rowcount
+        return deleted
+
+    def wake_all(self):
+        """Wakes every waiting claim() so workers can notice a shutdown."""
+        with self._available:
+            self._available.notify_all()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,6 +1,162 @@
 # main.py
 import argparse
-from monarch import Monarch
+import json
+import sys
+import threading
+from contextlib import redirect_stdout
+from cache import response_cache
+from job_cache import job_cache, HIT_THRESHOLD, POLISH_THRESHOLD
+from tracing import tracer
+from server import MonarchServer, MonarchClient, DEFAULT_HOST, DEFAULT_PORT, MAX_TRACE_SPANS, WAIT_TIMEOUT
+
+
+def read_batch(source):
+    """
+    Yields jobs from a JSONL stream. Each line is either a JSON object with a "prompt"
+    (plus optional "id" and "budget") or a bare JSON string used as the prompt.
+    Lines that can't be used are yielded with an "error" instead of stopping the batch.
+    """
+    for line_number, line in enumerate(source, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"id": line_number, "error": f"Line {line_number} is not valid JSON: {e}"}
+            continue
+        if isinstance(job, str):
+            job = {"prompt": job}
+        if not isinstance(job, dict):
+            yield {"id": line_number, "error": f"Line {line_number} must be a JSON object or string."}
+            continue
+        job.setdefault("id", line_number)
+        if not isinstance(job.get("prompt"), str) or not job["prompt"].strip():
+            job["error"] = f"Line {line_number} has no \"prompt\" string."
+        yield job
+
+
+def run_batch(monarch_controller, batch_path, concurrency):
+    """Runs every job in the batch file and streams one JSON result per line to stdout."""
+    results = sys.stdout
+    source = sys.stdin if batch_path == "-" else open(batch_path, 'r')
+    try:
+        # Agent chatter goes to stderr so stdout stays valid JSONL.
+        with redirect_stdout(sys.stderr):
+            for job, final_product, history, status in monarch_controller.execute_batch(read_batch(source),
+                                                                                         concurrency):
+                record = {
+                    "id": job["id"],
+                    "prompt": job.get("prompt"),
+                    "status": status,
+                    "result": final_product,
+                    "history": history,
+                }
+                if job.get("error"):
+                    record["error"] = job["error"]
+                results.write(json.dumps(record) + "\n")
+                results.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def run_remote_batch(client, batch_path, wait_timeout=WAIT_TIMEOUT):
+    """
+    Submits every job in the batch file to a Monarch server, then writes each result as JSONL.
+    Bad lines, jobs the server rejects and jobs that time out get a FAILED record with an "error".
+    """
+    source = sys.stdin if batch_path == "-" else open(batch_path, 'r')
+    try:
+        submitted = []
+        for job in read_batch(source):
+            if not job.get("error"):
+                try:
+                    job["remote_id"] = client.submit(job["prompt"], job.get("budget", 200))
+                except RuntimeError as e:
+                    job["error"] = f"The server rejected the job: {e}"
+            submitted.append(job)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    for job in submitted:
+        record = {"id": job["id"], "prompt": job.get("prompt"), "status": "FAILED", "result": None, "history": []}
+        if not job.get("error"):
+            try:
+                remote_job = client.wait(job["remote_id"], timeout=wait_timeout)
+                record.update(status=remote_job["status"], result=remote_job["result"],
+                              history=remote_job["history"])
+                if remote_job.get("error"):
+                    job["error"] = remote_job["error"]
+            except TimeoutError as e:
+                job["error"] = str(e)
+        if job.get("error"):
+            record["error"] = job["error"]
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+
+def print_deliverable(final_product, streamed=False):
+    print("\n--------------------------")
+    if final_product and streamed:
+        print("\n--- MONARCH'S FINAL DELIVERABLE was streamed above. ---")
+    elif final_product:
+        print("\n--- MONARCH'S FINAL DELIVERABLE ---")
+        print(final_product)
+    else:
+        print("The job could not be completed.")
+    print("\n" + "="*50)
+
+
+def make_token_printer():
+    """
+    Returns an on_token callback that prints streamed text, with a header whenever the step changes.
+    Its `streamed(text)` tells whether exactly that text was printed as one step's output.
+    """
+    lock = threading.Lock()
+    current = {"artifact": None}
+    printed = {}  # artifact name -> pieces of text printed for it
+
+    def on_token(artifact_name, text):
+        with lock:
+            if artifact_name != current["artifact"]:
+                current["artifact"] = artifact_name
+                printed[artifact_name] = []
+                sys.stdout.write(f"\n\n--- STREAMING: {artifact_name} ---\n")
+            printed[artifact_name].append(text)
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    def streamed(text):
+        with lock:
+            return any("".join(pieces) == text for pieces in printed.values())
+
+    on_token.streamed = streamed
+    return on_token
+
+
+def print_cache_stats():
+    """Reports how many LLM calls the response cache answered, and how many jobs the job cache did."""
+    if response_cache.mode != "off":
+        stats = response_cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate).")
+    if job_cache.enabled:
+        stats = job_cache.stats()
+        similarity = "" if stats["mean_similarity"] is None else \
+            f", similarity mean {stats['mean_similarity']:.3f} / max {stats['max_similarity']:.3f}"
+        print(f"Job cache: {stats['hits']} hits, {stats['polished']} polished, {stats['misses']} misses"
+              f" ({stats['hit_rate']:.0%} reused{similarity}).")
+
+
+def report_trace(args):
+    """Prints the --profile table and writes the --trace file, if either was asked for."""
+    if args.profile:
+        print("\n--- PROFILE ---")
+        print(tracer.summary())
+    if args.trace:
+        tracer.export(args.trace)
+        print(f"Trace written to {args.trace}.")
+
 
 def main():
     """
@@ -17,28 +173,231 @@ def main():
     parser.add_argument(
         "prompt",  # The name of the argument
         type=str,
+        nargs="?",
         help="The main task or prompt you want the agent army to work on."
     )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Run every job in a JSONL file ('-' for stdin) and stream JSONL results to stdout."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="How many batch jobs (or server workers) run at the same time (default: 4)."
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print each step's output token by token as it is written."
+    )
+    parser.add_argument(
+        "--eager-handoff",
+        action="store_true",
+        help="Start downstream workflow steps as soon as their inputs exist, before history and XP bookkeeping."
+    )
+
+    parser.add_argument(
+        "--semantic-routing",
+        action="store_true",
+        help="Route prompts with no guild keyword by similarity to each guild's description."
+    )
+    parser.add_argument(
+        "--army",
+        default="army.db",
+        metavar="FILE",
+        help="Where the army is stored: a SQLite database, or an army.json file (default: army.db)."
+    )
+    parser.add_argument(
+        "--import-army",
+        metavar="JSON_FILE",
+        help="Copy the agents from an army.json file into the army store, then exit."
+    )
+    parser.add_argument(
+        "--export-army",
+        metavar="JSON_FILE",
+        help="Write the whole army to an army.json file, then exit."
+    )
+
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the LLM response cache entirely."
+    )
+    cache_group.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached LLM responses but store the fresh ones."
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="Treat cached LLM responses older than this as misses."
+    )
+    parser.add_argument(
+        "--job-cache",
+        action="store_true",
+        help="Reuse past deliverables for requests similar to ones the same guild has already done."
+    )
+    parser.add_argument(
+        "--job-cache-threshold",
+        type=float,
+        default=HIT_THRESHOLD,
+        metavar="SIMILARITY",
+        help=f"Similarity at which a past deliverable is returned as is (default: {HIT_THRESHOLD})."
+    )
+    parser.add_argument(
+        "--polish-threshold",
+        type=float,
+        default=POLISH_THRESHOLD,
+        metavar="SIMILARITY",
+        help=f"Similarity at which only the final step runs, adapting the past deliverable (default: {POLISH_THRESHOLD})."
+    )
+    parser.add_argument(
+        "--job-cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="Ignore past deliverables older than this."
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as a long-lived server that keeps the army loaded and takes jobs over HTTP."
+    )
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_HOST,
+        help=f"Address the server listens on (default: {DEFAULT_HOST})."
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"Port the server listens on (default: {DEFAULT_PORT})."
+    )
+    parser.add_argument(
+        "--queue",
+        default="monarch_jobs.db",
+        metavar="FILE",
+        help="SQLite file holding the server's job queue and results (default: monarch_jobs.db)."
+    )
+    parser.add_argument(
+        "--server",
+        metavar="URL",
+        help="Send the prompt or --batch jobs to a running Monarch server (e.g. http://127.0.0.1:8765)."
+    )
+    parser.add_argument(
+        "--wait-timeout",
+        type=float,
+        default=WAIT_TIMEOUT,
+        metavar="SECONDS",
+        help=f"How long --server waits for each job to finish (default: {WAIT_TIMEOUT:g})."
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print wall time, queue wait, tokens, cost and budget units per job, step, tool and LLM call."
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write every span to FILE: JSON Lines for a .jsonl name, otherwise a Chrome/Perfetto trace."
+    )
 
     # 3. Parse the arguments from the command line
     args = parser.parse_args()
+    if not args.prompt and not args.batch and not args.import_army and not args.export_army and not args.serve:
+        parser.error("provide a prompt, --batch FILE or --serve")
+    if args.server and (args.serve or args.import_army or args.export_army):
+        parser.error("--server only sends a prompt or --batch jobs to a running server")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.polish_threshold > args.job_cache_threshold:
+        parser.error("--polish-threshold cannot be above --job-cache-threshold")
 
-    # 4. Initialize and run the Monarch system
-    monarch_controller = Monarch()
-    print("\n" + "="*50)
-    print(f"\n[USER JOB]: {args.prompt}")
+    # Keys in .env are needed by more than the OpenAI client (web search replayed from the cache, for one).
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
 
-    final_product, _ = monarch_controller.execute_job(args.prompt)
+    if args.no_cache:
+        response_cache.mode = "off"
+    elif args.refresh_cache:
+        response_cache.mode = "refresh"
+    response_cache.ttl = args.cache_ttl
+    job_cache.enabled = args.job_cache
+    job_cache.hit_threshold = args.job_cache_threshold
+    job_cache.polish_threshold = args.polish_threshold
+    job_cache.ttl = args.job_cache_ttl
+    if args.profile or args.trace:
+        tracer.enable(max_spans=MAX_TRACE_SPANS if args.serve else None)
 
-    print("\n--------------------------")
-    if final_product:
-        print("\n--- MONARCH'S FINAL DELIVERABLE ---")
-        print(final_product)
-    else:
-        print("The job could not be completed.")
+    if args.server:
+        # Thin client: the server does all the work, so nothing heavy is loaded here.
+        client = MonarchClient(args.server)
+        try:
+            if args.batch:
+                run_remote_batch(client, args.batch, args.wait_timeout)
+                return
+            job_id = client.submit(args.prompt)
+            print(f"Submitted job {job_id} to {args.server}. Waiting for it to finish...")
+            remote_job = client.wait(job_id, timeout=args.wait_timeout)
+        except (ConnectionError, TimeoutError, RuntimeError) as e:
+            sys.exit(f"Error: {e}")
+        print_deliverable(remote_job["result"])
+        return
+
+    # Imported only once there is real work to do, so --help and argument errors return instantly.
+    from monarch import Monarch
+
+    if args.import_army or args.export_army:
+        monarch_controller = Monarch(army_file=args.army)
+        if args.import_army:
+            monarch_controller.import_army(args.import_army)
+        if args.export_army:
+            monarch_controller.export_army(args.export_army)
+        return
 
+    # 4. Initialize and run the Monarch system
+    if args.serve:
+        monarch_controller = Monarch(army_file=args.army, eager_handoff=args.eager_handoff,
+                                     semantic_routing=args.semantic_routing)
+        MonarchServer(monarch_controller, queue_path=args.queue, host=args.host, port=args.port,
+                      workers=args.concurrency).serve()
+        print_cache_stats()
+        report_trace(args)
+        return
+
+    if args.batch:
+        with redirect_stdout(sys.stderr):
+            monarch_controller = Monarch(army_file=args.army, eager_handoff=args.eager_handoff,
+                                         semantic_routing=args.semantic_routing)
+        try:
+            run_batch(monarch_controller, args.batch, args.concurrency)
+        finally:
+            with redirect_stdout(sys.stderr):
+                monarch_controller.save_army()
+                print_cache_stats()
+                report_trace(args)
+        return
+
+    monarch_controller = Monarch(army_file=args.army, eager_handoff=args.eager_handoff,
+                                 semantic_routing=args.semantic_routing)
     print("\n" + "="*50)
+    print(f"\n[USER JOB]: {args.prompt}")
+
+    on_token = make_token_printer() if args.stream else None
+    final_product, _, _ = monarch_controller.execute_job(args.prompt, on_token=on_token)
+    # Only say the deliverable was streamed if it really was (not every step can stream).
+    print_deliverable(final_product, streamed=bool(on_token and on_token.streamed(final_product)))
     monarch_controller.save_army()
+    print_cache_stats()
+    report_trace(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
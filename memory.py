@@ -1,34 +1,190 @@
 #memory.py
+import atexit
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from tracing import tracer
 
-import chromadb
-#Initialize the ChromaDB client. It will store data locally in a folder
-client=chromadb.Client()
+# Memories are stored on disk so what the organization learns survives between runs.
+MEMORY_PATH = os.environ.get("MONARCH_MEMORY_DIR", "monarch_memory")
+# A new document this close (cosine distance) to an existing memory is treated as a duplicate.
+DUPLICATE_DISTANCE = 0.05
+# How many query embeddings and recall results are kept in memory.
+EMBEDDING_CACHE_SIZE = 1024
+RECALL_CACHE_SIZE = 256
+# Buffered memories that trigger a flush on their own; the rest are written at the end of a batch or run.
+FLUSH_THRESHOLD = 32
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # One flush at a time, so concurrent batches can't both store a duplicate.
+_client = None
+_collection = None
+_embedding_function = None
+_pending = []  # Memories waiting to be written by the next flush().
+_embedding_cache = OrderedDict()
+_recall_cache = OrderedDict()
+_recall_generation = 0  # Bumped by every flush that stores memories; older recalls are not cached.
+
+
+def _get_client():
+    """Starts the ChromaDB client on first use, so importing memory never starts a database."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                #Initialize the persistent ChromaDB client. It will store data locally in MEMORY_PATH.
+                _client = chromadb.PersistentClient(path=MEMORY_PATH)
+    return _client
+
+
+def open_collection(name):
+    """Gets or creates a collection (like a table in a traditional database) in the memory database."""
+    #Cosine distance makes thresholds such as DUPLICATE_DISTANCE independent of the embedding's scale.
+    return _get_client().get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+
+def _get_collection():
+    """The collection of past job deliverables used for recall."""
+    global _collection
+    if _collection is None:
+        collection = open_collection('project_monarch_memories')
+        with _lock:
+            if _collection is None:
+                _collection = collection
+    return _collection
+
+
+def _get_embedding_function():
+    """Loads the local embedding model on first use."""
+    global _embedding_function
+    if _embedding_function is None:
+        with _lock:
+            if _embedding_function is None:
+                from chromadb.utils import embedding_functions
+                _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _embedding_function
+
+
+def _cache_get(cache, key):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    return None
+
+
+def _cache_put(cache, key, value, max_size):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+def embed(texts: list) -> list:
+    """Embeds texts in one batch, reusing cached embeddings for texts seen before."""
+    keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    with _lock:
+        embeddings = [_cache_get(_embedding_cache, key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        fresh = _get_embedding_function()([texts[i] for i in missing])
+        with _lock:
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = [float(x) for x in embedding]
+                _cache_put(_embedding_cache, keys[i], embeddings[i], EMBEDDING_CACHE_SIZE)
+    return embeddings
+
+
+def cosine_distance(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1.0 - dot / norm if norm else 1.0
 
-#Get or create a "collection" which is like a table in a traditional database.
-#This will create a 'project_monarch'memories' folder if it doesn't exists.
-collection=client.get_or_create_collection(name='project_monarch_memories')
 
 def memorize(job_id: str, content: str):
-    """Saves a completed job's content to the vector database."""
+    """
+    Buffers a completed job's content; it is written to the vector database on the next flush(),
+    which happens here once FLUSH_THRESHOLD memories are waiting.
+    """
+    with _lock:
+        _pending.append({"job_id": str(job_id), "content": content})
+        full = len(_pending) >= FLUSH_THRESHOLD
+    print(f"---Memorized job {job_id}---")
+    if full:
+        flush()
+
+
+def flush():
+    """Writes every buffered memory in one batch, skipping exact and near-duplicate documents."""
+    with _flush_lock:
+        _flush()
+
+
+def _flush():
+    global _recall_generation
+    with _lock:
+        batch = _pending[:]
+        _pending.clear()
+    if not batch:
+        return
     try:
-        collection.add(
-            documents=[content],
-            metadatas=[{"type":"job_completion"}],
-            ids=[str(job_id)]
-        )
-        print(f"---Memorized job {job_id}---")
+        collection = _get_collection()
+        embeddings = embed([item["content"] for item in batch])
+
+        # Near-duplicates of what is already stored are dropped.
+        distances = [[] for _ in batch]
+        if collection.count():
+            nearest = collection.query(query_embeddings=embeddings, n_results=1, include=["distances"])
+            distances = nearest.get("distances") or distances
+
+        ids, documents, metadatas, vectors = [], [], [], []
+        for item, embedding, distance in zip(batch, embeddings, distances):
+            if distance and distance[0] < DUPLICATE_DISTANCE:
+                continue
+            # ...and so are near-duplicates within this batch.
+            if any(cosine_distance(embedding, kept) < DUPLICATE_DISTANCE for kept in vectors):
+                continue
+            ids.append(hashlib.sha256(item["content"].encode("utf-8")).hexdigest())
+            documents.append(item["content"])
+            metadatas.append({"type": "job_completion", "job_id": item["job_id"]})
+            vectors.append(embedding)
+
+        if ids:
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=vectors)
+        with _lock:
+            _recall_generation += 1
+            _recall_cache.clear()  # Cached recalls may now miss the new memories.
+        print(f"---Stored {len(ids)} new memories ({len(batch) - len(ids)} duplicates skipped)---")
     except Exception as e:
         print(f"Error during memorize: {e}")
 
+
+atexit.register(flush)
+
+
 def recall(query:str,n_results=1)->list:
     """Recalls similar past jobs from the vector database."""
-    try:
-        results=collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        return results['documents'][0] if results['documents'] else []
-    except Exception as e:
-        print(f"Error during recall: {e}")
-        return []
-
+    key = (query, n_results)
+    with tracer.span("memory.recall", "memory") as span:
+        with _lock:
+            cached = _cache_get(_recall_cache, key)
+            generation = _recall_generation
+        span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return list(cached)
+        try:
+            results=_get_collection().query(
+                query_embeddings=embed([query]),
+                n_results=n_results
+            )
+            documents = results['documents'][0] if results['documents'] else []
+            with _lock:
+                # A flush that finished while this query ran may have stored a better match.
+                if generation == _recall_generation:
+                    _cache_put(_recall_cache, key, documents, RECALL_CACHE_SIZE)
+            return list(documents)
+        except Exception as e:
+            print(f"Error during recall: {e}")
+            return []
@@ -1,80 +1,254 @@
 # monarch.py
+import contextvars
 import json
-from agent import ShadowAgent, RANKS, RANK_XP_THRESHOLDS
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from agent import ShadowAgent, rank_for_xp
+from army_store import open_army_store, JsonArmyStore
+from artifacts import artifact_store, paragraphs
+from context import MAX_CHUNK_AGENTS, MAX_MEMORY_TOKENS, MAX_PROMPT_TOKENS, count_tokens, split_into_chunks
 from job import Job
-from memory import memorize
+from job_cache import job_cache
+from job_queue import job_error
+from memory import memorize, flush as flush_memories
+from roster import Roster
+from router import GuildRouter
+from tracing import tracer
+from workflow import build_graph, compile_template, render_template, run_workflow
+
+# Each finished step outweighs any budget, so in-progress jobs finish before new ones start.
+STEP_PRIORITY_WEIGHT = 1_000_000
+# Chunks are never made smaller than this, however much of the prompt the rest of the task uses.
+MIN_CHUNK_TOKENS = 1000
+POLISH_PROMPT = (
+    "A previous job produced the deliverable below for a very similar request. Adapt it so it fully "
+    "answers the new request, changing only what needs to change.\n\n"
+    "New request:\n{request}\n\nPrevious request:\n{previous_request}\n\n"
+    "Previous deliverable:\n{deliverable}"
+)
+MERGE_PROMPT = (
+    "The task below was split into {count} parts, each done on a different section of its input. "
+    "Combine the partial results into one complete and coherent result for the whole task, "
+    "keeping every important detail and removing repetition.\n\n"
+    "Task:\n{task}\n\nPartial results:\n{parts}"
+)
+
+
+def _pack(parts, max_tokens):
+    """Groups consecutive parts so each group's total stays within max_tokens (oversized parts stand alone)."""
+    groups, current, current_tokens = [], [], 0
+    for part in parts:
+        tokens = count_tokens(part)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
 
 
 class Monarch:
-    def __init__(self, army_file="army.json", guild_config_file="guilds.json"):
-        self.army = {}
+    def __init__(self, army_file="army.db", guild_config_file="guilds.json", eager_handoff=False,
+                 semantic_routing=False):
+        self.army = {}  # Agents loaded so far; each specialty is loaded from the store on first use.
+        self.roster = Roster()  # Specialty/rank index over self.army for fast agent selection.
+        # Start downstream steps as soon as an artifact exists, before history/XP bookkeeping.
+        self.eager_handoff = eager_handoff
         self.army_file = army_file
         self.specialty_counters={}
-        self._load_guild_configs(guild_config_file)
+        # Guards the army, the recruitment counters and agent XP when jobs run concurrently.
+        self._lock = threading.RLock()
+        self._loaded_specialties = set()
+        self._dirty_agents = set()  # Agents whose changes haven't been written to the store yet.
+        self._load_guild_configs(guild_config_file, semantic_routing)
         self._load_army()
-        print(f"Monarch System Initialized. Managing {len(self.army)} agents across {len(self.guilds)} guilds.")
+        print(f"Monarch System Initialized. Managing {self.store.count()} agents across {len(self.guilds)} guilds.")
 
-    def _load_guild_configs(self, guild_config_file):
+    def _load_guild_configs(self, guild_config_file, semantic_routing=False):
         """Loads the guild definitions from the config file."""
         with open(guild_config_file, 'r') as f:
             self.guilds = json.load(f)
+        # Keyword routing is compiled once from every guild, so new guilds need no code changes.
+        self.router = GuildRouter(self.guilds, semantic_fallback=semantic_routing)
+        # Step dependencies are inferred once per guild so each job only has to schedule them.
+        self.workflow_graphs = {
+            guild_name: build_graph(config["workflow"])
+            for guild_name, config in self.guilds.items() if guild_name != "rank_costs"
+        }
+        # Which guild config an agent of each specialty uses (the first guild that defines its prompt).
+        self.specialty_guilds = {}
+        for guild_name, config in self.guilds.items():
+            if guild_name != "rank_costs":
+                for specialty in config.get('prompts', {}):
+                    self.specialty_guilds.setdefault(specialty, config)
 
     def _determine_guild(self, user_request):
-        """Dynamically determines the guild by checking for specific keywords first."""
-        prompt = user_request.lower()
-
-        # Prioritize Coder and Artist guilds as their keywords are more specific.
-        if any(keyword in prompt for keyword in self.guilds["Coder"]["keywords"]):
-            return "Coder", self.guilds["Coder"]
-        if any(keyword in prompt for keyword in self.guilds["Artist"]["keywords"]):
-            return "Artist", self.guilds["Artist"]
-        # Default to Writer if no other specific keywords are found.
-        return "Writer", self.guilds["Writer"]
+        """Routes the request by guild keywords and priorities (see GuildRouter)."""
+        guild_name = self.router.route(user_request)
+        return guild_name, self.guilds[guild_name]
 
     def _get_agent(self, specialty, guild_config, min_rank="F"):
-        """Finds the most cost-effective agent that meets the minimum rank."""
-
-        qualified_agents = []
-        for agent in self.army.values():
-            if agent.specialty == specialty and RANKS.index(agent.rank) >= RANKS.index(min_rank):
-                qualified_agents.append(agent)
-
-        if qualified_agents:
-            # Sort agents by rank (cheapest first) and pick the first one
-            qualified_agents.sort(key=lambda x: RANKS.index(x.rank))
-            cheapest_agent = qualified_agents[0]
-            print(
-                f"Monarch: Found {len(qualified_agents)} qualified agents. Choosing the most cost-effective: {cheapest_agent.agent_id} ({cheapest_agent.rank} Rank).")
-            return cheapest_agent
-
-        # --- Creation logic remains the same ---
-        start_role = guild_config.get("start_role")
-        if specialty == start_role:
-            print(f"Monarch: No available '{specialty}'. Recruiting a new F-Rank agent.")
-            current_count = self.specialty_counters.get(specialty, 0) + 1
-            self.specialty_counters[specialty] = current_count
-            agent_id = f"{specialty[0]}-{current_count:03d}"
-            new_agent = ShadowAgent(agent_id, "F", specialty, guild_config)
-            self.army[agent_id] = new_agent
-            return new_agent
-        else:
-            return None
+        """
+        Finds the most cost-effective agent that meets the minimum rank, preferring the least busy one.
+        The agent is reserved for one task; hand it back with _release_agent when the task is done.
+        """
+        with self._lock:
+            self._ensure_loaded(specialty)
+            cheapest_agent = self.roster.best(specialty, min_rank)
+            if cheapest_agent:
+                print(
+                    f"Monarch: Found {self.roster.count(specialty, min_rank)} qualified agents. Choosing the most cost-effective: {cheapest_agent.agent_id} ({cheapest_agent.rank} Rank).")
+                self.roster.acquire(cheapest_agent)
+                return cheapest_agent
 
+            # --- Creation logic remains the same ---
+            start_role = guild_config.get("start_role")
+            if specialty == start_role:
+                print(f"Monarch: No available '{specialty}'. Recruiting a new F-Rank agent.")
+                if specialty not in self.specialty_counters:
+                    # Continue numbering after every stored id with this prefix, including promoted agents.
+                    self.specialty_counters[specialty] = self.store.max_id_number(f"{specialty[0]}-")
+                current_count = self.specialty_counters[specialty] + 1
+                self.specialty_counters[specialty] = current_count
+                agent_id = f"{specialty[0]}-{current_count:03d}"
+                new_agent = ShadowAgent(agent_id, "F", specialty, guild_config)
+                self.army[agent_id] = new_agent
+                self.roster.add(new_agent)
+                self._dirty_agents.add(agent_id)
+                self.roster.acquire(new_agent)
+                return new_agent
+            else:
+                return None
+
+    def _estimated_cost(self, step):
+        """What a step's agent will likely cost: the rank of the cheapest qualified agent right now."""
+        with self._lock:
+            self._ensure_loaded(step["role"])
+            agent = self.roster.best(step["role"], step["min_rank"])
+        return self.guilds["rank_costs"].get(agent.rank if agent else step["min_rank"], 20)
+
+    def _get_helpers(self, specialty, min_rank, count, exclude):
+        """Reserves up to `count` more qualified agents (never recruiting), the least busy of any rank first."""
+        with self._lock:
+            self._ensure_loaded(specialty)
+            helpers = self.roster.least_busy(specialty, min_rank, count, exclude)
+            for helper in helpers:
+                self.roster.acquire(helper)
+            return helpers
+
+    def _release_agent(self, agent):
+        """Hands a reserved agent back so it counts as free again for least-busy selection."""
+        with self._lock:
+            self.roster.release(agent)
 
     def _is_agent_available(self, specialty, min_rank):
         """Checks if a qualified agent exists without creating one."""
-        for agent in self.army.values():
-            if agent.specialty == specialty and RANKS.index(agent.rank) >= RANKS.index(min_rank):
-                return True
-        return False
+        with self._lock:
+            self._ensure_loaded(specialty)
+            return self.roster.has(specialty, min_rank)
 
-    def execute_job(self, user_request):
+    def _award_xp(self, agent, points):
+        """Awards XP under the army lock so concurrent jobs can't interleave rank-ups."""
+        with self._lock:
+            agent.gain_xp(points)
+            self.roster.update(agent)  # Rank-ups and class advancements move the agent between buckets.
+            self._dirty_agents.add(agent.agent_id)
+
+    def execute_job(self, user_request, budget=200, on_token=None):
         """
         Intelligently handles a request by checking for army capabilities first.
+        If `on_token(artifact_name, text)` is given, each step's answer is streamed to it as it is written.
+        Returns (final_product, history, status): status is "COMPLETED" for a full workflow (or a
+        reused deliverable), "BEST_EFFORT" for a single understaffed step, and "FAILED" otherwise.
         """
         guild_name, guild_config = self._determine_guild(user_request)
-        current_job = Job(user_request)
+        current_job = Job(user_request, budget)
         print(f"Monarch: Task assigned to the {guild_name}'s Guild.")
+        with tracer.span(f"job {guild_name}", "job", job_id=current_job.id, guild=guild_name, budget=budget) as span:
+            # Images are links that expire, so only text guilds use the job cache.
+            use_job_cache = job_cache.enabled and guild_name != "Artist"
+            reused = self._reuse_deliverable(current_job, guild_name, guild_config, on_token) if use_job_cache else None
+            if reused:
+                final_product, history = reused
+                current_job.status = "COMPLETED"
+            else:
+                try:
+                    final_product, history = self._execute_workflow(current_job, guild_name, guild_config, on_token)
+                finally:
+                    # The deliverable is plain text by now; spilled step outputs are no longer needed.
+                    artifact_store.release(current_job.artifacts.values())
+                # Best-effort answers are not worth reusing; only full workflow results are cached.
+                if final_product and use_job_cache and current_job.status == "COMPLETED":
+                    job_cache.store(user_request, guild_name, final_product, current_job.id)
+            if not final_product:
+                current_job.status = "FAILED"
+            span.set(status=current_job.status.lower(), budget_units=current_job.cost)
+        return final_product, history, current_job.status
+
+    def _reuse_deliverable(self, current_job, guild_name, guild_config, on_token=None):
+        """
+        Answers a request from the job cache. A close enough past deliverable is returned as is;
+        a near match is adapted by an agent of the workflow's final role. Returns
+        (final_product, history), or None when the full workflow has to run.
+        """
+        outcome, similarity, match = job_cache.lookup(current_job.user_request, guild_name)
+        tracer.current().set(job_cache=outcome, similarity=similarity)
+        if match is None:
+            print("Job cache: no past deliverable from this guild yet.")
+            return None
+        print(f"Job cache: closest past request (job {match['job_id']}) has similarity {similarity:.3f} -> {outcome}.")
+        final_step = guild_config["workflow"][-1]
+
+        if outcome == "hit":
+            if on_token:
+                on_token(final_step["artifact_name"], match["result"])
+            current_job.add_history("job-cache", f"Reused the deliverable of job {match['job_id']}", match["result"])
+            return match["result"], current_job.history
+        if outcome != "polish":
+            return None
+        result = self._polish_deliverable(current_job, guild_name, guild_config, match, on_token)
+        job_cache.record_polish(bool(result))
+        if not result:
+            print("Job cache: the past deliverable could not be polished. Running the full workflow.")
+            return None
+        job_cache.store(current_job.user_request, guild_name, result, current_job.id)
+        memorize(job_id=current_job.id, content=result)
+        return result, current_job.history
+
+    def _polish_deliverable(self, current_job, guild_name, guild_config, match, on_token=None):
+        """Has an agent of the workflow's final role adapt a past deliverable; returns it, or None."""
+        final_step = guild_config["workflow"][-1]
+        agent = self._get_agent(final_step["role"], guild_config, final_step["min_rank"])
+        if agent is None:
+            return None
+        agent_cost = self.guilds["rank_costs"].get(agent.rank, 20)
+        if current_job.cost + agent_cost > current_job.budget:
+            self._release_agent(agent)
+            return None
+        current_job.cost += agent_cost
+        print(f"Monarch: Assigning agent {agent.agent_id} to polish the past deliverable. Cost: {agent_cost}.")
+        prompt = POLISH_PROMPT.format(request=current_job.user_request, previous_request=match["request"],
+                                      deliverable=match["result"])
+        with tracer.span(f"{guild_name}.{final_step['role']} (polish)", "step", agent=agent.agent_id,
+                         rank=agent.rank, budget_units=agent_cost):
+            try:
+                result = self._run_agent(agent, guild_name, prompt, final_step["artifact_name"], on_token,
+                                         self._job_priority(current_job))
+            finally:
+                self._release_agent(agent)
+        if not result:
+            return None
+        self._award_xp(agent, 20)
+        self.flush_army()
+        current_job.add_history(agent.agent_id, f"Polished the deliverable of job {match['job_id']}", result)
+        return result
+
+    def _execute_workflow(self, current_job, guild_name, guild_config, on_token=None):
+        """Runs the guild's workflow for the job, or a single best-effort step if it is understaffed."""
+        user_request = current_job.user_request
 
         # --- CAPABILITY ASSESSMENT ---
         workflow = guild_config["workflow"]
@@ -86,35 +260,79 @@ class Monarch:
 
         # --- EXECUTION BASED ON ASSESSMENT ---
         if can_execute_full_workflow:
-            print("Monarch: Qualified specialists found. Executing full multi-step workflow.")
-            for step in workflow:
-                role, min_rank, task_prompt, artifact_name = step["role"], step["min_rank"], step["task"], step[
-                    "artifact_name"]
-                for key, value in current_job.artifacts.items():
-                    task_prompt = task_prompt.replace(f"{{{key}}}", value)
-                task_prompt = task_prompt.replace("{request}", user_request)
-                agent = self._get_agent(role, guild_config, min_rank)  # Corrected to self._get_agent
-                # --- NEW: Budget Check ---
+            print("Monarch: Qualified specialists found. Executing workflow steps as soon as their inputs are ready.")
+            budget_lock = threading.Lock()
+            assigned_agents = {}
+            # What each step that hasn't been charged yet is expected to cost, held back from chunk helpers.
+            unstarted = {step["artifact_name"]: self._estimated_cost(step) for step in workflow}
+
+            def charge(agent, step=None):
+                """
+                Books the agent's cost against the job; returns the cost, or None if it is over budget.
+                A step's own agent is charged with its `step`; chunk helpers are charged without one
+                and only if the budget still covers every step that hasn't started.
+                """
                 agent_cost = self.guilds["rank_costs"].get(agent.rank, 20)
-                if current_job.cost + agent_cost > current_job.budget:
-                    print(f"Job failed: Assigning agent {agent.agent_id} (cost: {agent_cost}) would exceed budget.")
-                    current_job.status = "FAILED"
-                    return None, current_job.history
-                current_job.cost += agent_cost
-                print(f"Monarch: Assigning agent {agent.agent_id}. Cost: {agent_cost}. Total cost: {current_job.cost}/{current_job.budget}")
-                result = agent.perform_task(task_prompt) if guild_name != "Artist" else agent.create_image(task_prompt)
+                with budget_lock:
+                    if step is not None:
+                        unstarted.pop(step["artifact_name"], None)
+                    reserved = 0 if step is not None else sum(unstarted.values())
+                    if current_job.cost + agent_cost + reserved > current_job.budget:
+                        return None
+                    current_job.cost += agent_cost
+                    print(f"Monarch: Assigning agent {agent.agent_id}. Cost: {agent_cost}. Total cost: {current_job.cost}/{current_job.budget}")
+                tracer.current().add(budget_units=agent_cost)  # Charged to the step being run.
+                return agent_cost
+
+            def run_step(step):
+                role, min_rank, artifact_name = step["role"], step["min_rank"], step["artifact_name"]
+                values = {"request": user_request, **current_job.artifacts}
+                task_prompt = render_template(step["task"], values)
+                with tracer.span(f"{guild_name}.{role}", "step", artifact=artifact_name) as span:
+                    agent = self._get_agent(role, guild_config, min_rank)  # Corrected to self._get_agent
+                    span.set(agent=agent.agent_id, rank=agent.rank)
+                    # --- NEW: Budget Check ---
+                    agent_cost = charge(agent, step)
+                    if agent_cost is None:
+                        print(f"Job failed: Assigning agent {agent.agent_id} (cost: {self.guilds['rank_costs'].get(agent.rank, 20)}) would exceed budget.")
+                        span.set(status="over budget")
+                        self._release_agent(agent)
+                        return None
+                    try:
+                        if guild_name != "Artist" and count_tokens(task_prompt) > MAX_PROMPT_TOKENS:
+                            result = self._run_chunked(agent, step, guild_name, values, charge,
+                                                       on_token, self._job_priority(current_job))
+                        else:
+                            result = self._run_agent(agent, guild_name, task_prompt, artifact_name, on_token,
+                                                     self._job_priority(current_job))
+                    finally:
+                        self._release_agent(agent)
                 if not result:
-                    current_job.status = "FAILED"
-                    return None, current_job.history
-                current_job.artifacts[artifact_name] = result
-                current_job.add_history(agent.agent_id, f"Completed step: {role}", result)
-                agent.gain_xp(20)
+                    return None
+                # Large outputs move to disk here; the job keeps a handle instead of the text.
+                current_job.artifacts[artifact_name] = artifact_store.put(result)
+                assigned_agents[artifact_name] = agent
+                return current_job.artifacts[artifact_name]
+
+            def finish_step(step, result):
+                agent = assigned_agents[step["artifact_name"]]
+                current_job.add_history(agent.agent_id, f"Completed step: {step['role']}", result)
+                self._award_xp(agent, 20)
+                self.flush_army()  # Persist XP step by step so a crash mid-job loses nothing earned.
+
+            if not run_workflow(workflow, self.workflow_graphs[guild_name], run_step,
+                                on_complete=finish_step, eager_handoff=self.eager_handoff):
+                current_job.status = "FAILED"
+                return None, current_job.history
 
             final_artifact_name = workflow[-1]["artifact_name"]
             final_product = current_job.artifacts.get(final_artifact_name)
+            if final_product is not None:
+                final_product = str(final_product)
 
             # --- ADD MEMORIZE CALL HERE (for full workflow) ---
             if final_product:
+                current_job.status = "COMPLETED"
                 memorize(job_id=current_job.id, content=final_product)
 
             return final_product, current_job.history
@@ -122,11 +340,18 @@ class Monarch:
             # --- FALLBACK: "Best Effort" Mode ---
             print("Monarch: High-rank specialists not available. Falling back to 'Best Effort' mode.")
             start_role = guild_config["start_role"]
-            agent = self._get_agent(start_role, guild_config, "F")  # Corrected to self._get_agent
-
-            result = agent.perform_task(user_request) if guild_name != "Artist" else agent.create_image(user_request)
+            with tracer.span(f"{guild_name}.{start_role} (best effort)", "step") as span:
+                agent = self._get_agent(start_role, guild_config, "F")  # Corrected to self._get_agent
+                span.set(agent=agent.agent_id, rank=agent.rank)
+                try:
+                    result = self._run_agent(agent, guild_name, user_request, guild_config["workflow"][-1]["artifact_name"], on_token,
+                                             self._job_priority(current_job))
+                finally:
+                    self._release_agent(agent)
             if result:
-                agent.gain_xp(25)
+                current_job.status = "BEST_EFFORT"
+                self._award_xp(agent, 25)
+                self.flush_army()
                 current_job.add_history(agent.agent_id, "Completed job via Best Effort", result)
 
                 # --- ADD MEMORIZE CALL HERE (for Best Effort mode) ---
@@ -136,43 +361,203 @@ class Monarch:
             else:
                 return None, [f"Best-effort attempt by {agent.agent_id} failed."]
 
-    def _load_army(self):
-        """Loads the army state and correctly recalculates rank from XP."""
+    def _run_chunked(self, agent, step, guild_name, values, charge, on_token=None, priority=0):
+        """
+        Map-reduce for a step whose prompt would exceed MAX_PROMPT_TOKENS: its largest input is
+        split into chunks, the chunks are worked on in parallel by the step's agent plus up to
+        MAX_CHUNK_AGENTS - 1 more agents of the same role (as far as the budget allows), and the
+        partial results are merged. `charge(agent)` books a helper's cost against the job.
+        """
+        inputs = [name for name in compile_template(step["task"])[1::2] if name in values]
+        if not inputs:
+            return self._run_agent(agent, guild_name, render_template(step["task"], values), step["artifact_name"],
+                                   on_token, priority)
+        largest = max(inputs, key=lambda name: len(values[name]))
+        frame = render_template(step["task"], {**values, largest: ""})
+        chunk_tokens = max(MIN_CHUNK_TOKENS, MAX_PROMPT_TOKENS - MAX_MEMORY_TOKENS - count_tokens(frame))
+        chunks = split_into_chunks(paragraphs(values[largest]), chunk_tokens)
+
+        workers = [agent]
+        helpers = self._get_helpers(step["role"], step["min_rank"], min(MAX_CHUNK_AGENTS, len(chunks)) - 1,
+                                    exclude={agent.agent_id})
+        for index, helper in enumerate(helpers):
+            if charge(helper) is None:
+                for unused in helpers[index:]:
+                    self._release_agent(unused)
+                break
+            workers.append(helper)
+        print(f"Monarch: '{largest}' is too long for one prompt. Splitting it into {len(chunks)} parts "
+              f"for {len(workers)} {step['role']} agents.")
+
+        def work(worker_index):
+            worker, results = workers[worker_index], {}
+            for index in range(worker_index, len(chunks), len(workers)):
+                part = f"[Part {index + 1} of {len(chunks)} of '{largest}']\n{chunks[index]}"
+                with tracer.span(f"{guild_name}.{step['role']} part", "chunk", agent=worker.agent_id):
+                    results[index] = self._run_agent(worker, guild_name, render_template(step["task"], {**values, largest: part}),
+                                                     step["artifact_name"], priority=priority)
+            return results
+
+        parts = {}
+        try:
+            with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+                # Each worker runs in its own copy of this context, so its trace spans nest under the step.
+                futures = [executor.submit(contextvars.copy_context().run, work, i) for i in range(len(workers))]
+                for future in futures:
+                    parts.update(future.result())
+        finally:
+            for helper in workers[1:]:
+                self._release_agent(helper)
+        if not all(parts.get(index) for index in range(len(chunks))):
+            return None
+        for helper in workers[1:]:
+            self._award_xp(helper, 10)
+        task = render_template(step["task"], {**values, largest: f"(the '{largest}', given in parts)"})
+        return self._merge_parts(agent, guild_name, step, task, [parts[index] for index in range(len(chunks))],
+                                 on_token, priority)
+
+    def _merge_parts(self, agent, guild_name, step, task, parts, on_token=None, priority=0):
+        """Combines partial results into one, in rounds of merges that each fit the prompt budget."""
+        limit = MAX_PROMPT_TOKENS - MAX_MEMORY_TOKENS
+        while len(parts) > 1:
+            prompt = MERGE_PROMPT.format(task=task, count=len(parts), parts="\n\n".join(
+                f"--- Part {index + 1} ---\n{part}" for index, part in enumerate(parts)))
+            groups = _pack(parts, limit - count_tokens(task))
+            if count_tokens(prompt) <= limit or len(groups) == len(parts):
+                with tracer.span(f"{guild_name}.{step['role']} merge", "chunk", agent=agent.agent_id, parts=len(parts)):
+                    return self._run_agent(agent, guild_name, prompt, step["artifact_name"], on_token, priority)
+            # Too many parts for one prompt: merge neighbouring parts first, in parallel.
+            with ThreadPoolExecutor(max_workers=min(MAX_CHUNK_AGENTS, len(groups))) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self._merge_parts, agent, guild_name,
+                                           step, task, group, None, priority) for group in groups]
+                parts = [future.result() for future in futures]
+            if not all(parts):
+                return None
+        return parts[0]
+
+    def _job_priority(self, job):
+        """Scheduling priority for a job's next model call: later workflow steps first, then bigger budgets."""
+        return len(job.artifacts) * STEP_PRIORITY_WEIGHT + job.budget
+
+    def _run_agent(self, agent, guild_name, task_prompt, artifact_name, on_token=None, priority=0):
+        """
+        Has the agent produce an artifact, streaming text steps to `on_token` when given.
+        Images can't be streamed, so their URL is passed to `on_token` once it is known.
+        """
+        if guild_name == "Artist":
+            url = agent.create_image(task_prompt, priority=priority)
+            if url and on_token:
+                on_token(artifact_name, url)
+            return url
+        if on_token:
+            return agent.perform_task(task_prompt, on_token=lambda text: on_token(artifact_name, text),
+                                      priority=priority)
+        return agent.perform_task(task_prompt, priority=priority)
+
+    def execute_batch(self, jobs, concurrency=4):
+        """
+        Runs many jobs concurrently and yields (job, final_product, history, status) as each one finishes.
+        `jobs` may be any iterable of dicts with a "prompt" and an optional "budget"; it is
+        consumed lazily, so at most a couple of jobs per worker are ever waiting in the queue.
+        Jobs that are invalid (or already carry an "error") fail on their own without stopping the batch.
+        """
+        jobs = iter(jobs)
         try:
-            with open(self.army_file, 'r') as f:
-                content = f.read()
-                if not content: return
-
-                army_data = json.loads(content)
-                for agent_id, data in army_data.items():
-                    specialty = data['specialty']
-                    agent_guild_config = None
-
-                    # --- CORRECTED LOGIC ---
-                    # Find which guild this agent belongs to by checking the specialty against each guild's prompts
-                    for guild_name, config in self.guilds.items():
-                        if guild_name != "rank_costs" and specialty in config.get('prompts', {}):
-                            agent_guild_config = config
-                            break
-                    # --- END OF CORRECTION ---
-
-                    if agent_guild_config:
-                        agent = ShadowAgent(data['agent_id'], "F", specialty, agent_guild_config)
-                        agent.xp = data['xp']
-                        # Recalculate true rank
-                        for rank in RANKS:
-                            if agent.xp >= RANK_XP_THRESHOLDS.get(rank, float('inf')):
-                                agent.rank = rank
-                            else:
-                                break
-                        agent.update_config()
-                        self.army[agent_id] = agent
-
-        except FileNotFoundError:
-            print("No existing army file found. Starting with a new army.")
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                in_flight = {}
+                rejected = []
+
+                def submit_next():
+                    job = next(jobs, None)
+                    if job is None:
+                        return False
+                    prompt, budget = job.get("prompt"), job.get("budget", 200)
+                    error = job.get("error") or job_error(prompt, budget)
+                    if error:
+                        job["error"] = error
+                        rejected.append(job)
+                        return True
+                    future = executor.submit(self.execute_job, prompt, budget)
+                    in_flight[future] = job
+                    return True
+
+                while len(in_flight) < concurrency * 2 and submit_next():
+                    pass
+
+                while in_flight or rejected:
+                    while rejected:
+                        job = rejected.pop(0)
+                        submit_next()
+                        yield job, None, [job["error"]], "FAILED"
+                    if not in_flight:
+                        continue
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = in_flight.pop(future)
+                        try:
+                            final_product, history, status = future.result()
+                        except Exception as e:
+                            final_product, history, status = None, [f"Job raised an error: {e}"], "FAILED"
+                        submit_next()
+                        yield job, final_product, history, status
+        finally:
+            # Memories from the whole batch are written together (memorize flushes early if many pile up).
+            flush_memories()
+
+    def _load_army(self):
+        """Opens the army store; agents themselves are loaded per specialty on first use."""
+        self.store = open_army_store(self.army_file)
+        # Carry over an existing army.json the first time a database store is used.
+        legacy_file = os.path.join(os.path.dirname(self.army_file), "army.json")
+        if not isinstance(self.store, JsonArmyStore) and self.store.count() == 0 and os.path.exists(legacy_file):
+            self.import_army(legacy_file)
+
+    def _ensure_loaded(self, specialty):
+        """Loads every stored agent of a specialty into the army the first time it is needed."""
+        with self._lock:
+            if specialty in self._loaded_specialties:
+                return
+            self._loaded_specialties.add(specialty)
+            agent_guild_config = self.specialty_guilds.get(specialty)
+            if not agent_guild_config:
+                return
+            for data in self.store.load(specialty):
+                if data['agent_id'] in self.army:
+                    continue
+                # Rank is always derived from XP so older files with stale ranks load correctly.
+                agent = ShadowAgent(data['agent_id'], rank_for_xp(data['xp']), specialty, agent_guild_config)
+                agent.xp = data['xp']
+                self.army[agent.agent_id] = agent
+                self.roster.add(agent)
+
+    def flush_army(self):
+        """Writes only the agents that changed since the last flush."""
+        with self._lock:
+            records = [self.army[agent_id].to_dict() for agent_id in self._dirty_agents]
+            self._dirty_agents.clear()
+            self.store.save(records)
 
     def save_army(self):
-        with open(self.army_file, 'w') as f:
-            army_data = {id: agent.to_dict() for id, agent in self.army.items()}
-            json.dump(army_data, f, indent=4)
-        print("Army state saved.")
\ No newline at end of file
+        self.flush_army()
+        print("Army state saved.")
+
+    def import_army(self, json_file):
+        """Copies every agent from an army.json file into the store."""
+        records = JsonArmyStore(json_file).load()
+        with self._lock:
+            self.store.save(records)
+            # Drop anything already loaded so imported agents are picked up on next use.
+            self.army.clear()
+            self.roster = Roster()
+            self._loaded_specialties.clear()
+            self.specialty_counters.clear()
+        print(f"Imported {len(records)} agents from {json_file}.")
+
+    def export_army(self, json_file):
+        """Writes the whole army, in the original army.json format."""
+        self.flush_army()
+        with self._lock:
+            records = self.store.load()
+        with open(json_file, 'w') as f:
+            json.dump({record["agent_id"]: record for record in records}, f, indent=4)
+        print(f"Exported {len(records)} agents to {json_file}.")
@@ -0,0 +1,116 @@
+# roster.py
+import heapq
+import itertools
+from agent import RANKS
+
+RANK_INDEX = {rank: index for index, rank in enumerate(RANKS)}
+
+
+class Roster:
+    """
+    An index of the army by specialty, with one bucket per rank.
+    Each bucket is a heap ordered by how many tasks an agent is currently running, so picking
+    the cheapest qualified, least busy agent never scans the whole army.
+    The roster is not thread-safe on its own; the Monarch serializes access with its army lock.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # specialty -> one heap of (load, seq, agent_id) per rank
+        self._counts = {}  # specialty -> number of agents per rank
+        self._positions = {}  # agent_id -> (specialty, rank index) the agent is indexed under
+        self._agents = {}
+        self._load = {}  # agent_id -> tasks in flight
+        self._entry = {}  # agent_id -> seq of its only valid heap entry; older entries are stale
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._agents)
+
+    def __contains__(self, agent_id):
+        return agent_id in self._agents
+
+    def add(self, agent):
+        """Indexes a newly loaded or recruited agent."""
+        self._agents[agent.agent_id] = agent
+        self._load.setdefault(agent.agent_id, 0)
+        self._index(agent)
+
+    def update(self, agent):
+        """Re-indexes an agent after a rank-up or class advancement."""
+        if self._positions.get(agent.agent_id) != (agent.specialty, RANK_INDEX[agent.rank]):
+            self._unindex(agent.agent_id)
+            self._index(agent)
+
+    def count(self, specialty, min_rank="F"):
+        """How many agents of this specialty are at or above `min_rank`."""
+        counts = self._counts.get(specialty)
+        return sum(counts[RANK_INDEX[min_rank]:]) if counts else 0
+
+    def has(self, specialty, min_rank="F"):
+        return self.count(specialty, min_rank) > 0
+
+    def best(self, specialty, min_rank="F"):
+        """Returns the lowest-ranked qualified agent, preferring the least busy one within that rank."""
+        counts = self._counts.get(specialty)
+        if not counts:
+            return None
+        for rank_index in range(RANK_INDEX[min_rank], len(RANKS)):
+            if counts[rank_index]:
+                heap = self._buckets[specialty][rank_index]
+                while heap:
+                    load, seq, agent_id = heap[0]
+                    if self._entry.get(agent_id) == seq:
+                        return self._agents[agent_id]
+                    heapq.heappop(heap)  # Drop entries left behind by load changes or re-indexing.
+        return None
+
+    def least_busy(self, specialty, min_rank="F", count=1, exclude=()):
+        """
+        Up to `count` qualified agents whose ids are not in `exclude`, least busy first and then
+        lowest-ranked, across every rank from `min_rank` up (used to spread one step over several agents).
+        """
+        buckets = self._buckets.get(specialty)
+        if not buckets or count <= 0:
+            return []
+        entries = [(load, rank_index, seq, agent_id)
+                   for rank_index in range(RANK_INDEX[min_rank], len(RANKS))
+                   for load, seq, agent_id in buckets[rank_index]
+                   if self._entry.get(agent_id) == seq and agent_id not in exclude]
+        return [self._agents[entry[3]] for entry in heapq.nsmallest(count, entries)]
+
+    def acquire(self, agent):
+        """Marks one more task as running on the agent."""
+        self._load[agent.agent_id] += 1
+        self._push(agent.agent_id)
+
+    def release(self, agent):
+        """Marks one of the agent's tasks as finished."""
+        self._load[agent.agent_id] = max(0, self._load[agent.agent_id] - 1)
+        self._push(agent.agent_id)
+
+    def _index(self, agent):
+        rank_index = RANK_INDEX[agent.rank]
+        if agent.specialty not in self._buckets:
+            self._buckets[agent.specialty] = [[] for _ in RANKS]
+            self._counts[agent.specialty] = [0] * len(RANKS)
+        self._positions[agent.agent_id] = (agent.specialty, rank_index)
+        self._counts[agent.specialty][rank_index] += 1
+        self._push(agent.agent_id)
+
+    def _unindex(self, agent_id):
+        position = self._positions.pop(agent_id, None)
+        if position:
+            specialty, rank_index = position
+            self._counts[specialty][rank_index] -= 1
+            self._entry.pop(agent_id, None)  # Its heap entry becomes stale and is skipped lazily.
+
+    def _push(self, agent_id):
+        specialty, rank_index = self._positions[agent_id]
+        seq = next(self._seq)
+        self._entry[agent_id] = seq
+        heap = self._buckets[specialty][rank_index]
+        heapq.heappush(heap, (self._load[agent_id], seq, agent_id))
+        # Rebuild a bucket once stale entries dominate it, so heaps stay proportional to their agents.
+        if len(heap) > 2 * self._counts[specialty][rank_index] + 16:
+            heap[:] = [entry for entry in heap if self._entry.get(entry[2]) == entry[1]]
+            heapq.heapify(heap)
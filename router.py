@@ -0,0 +1,134 @@
+# router.py
+import re
+
+
+def _trie_pattern(node):
+    """Turns a character trie into a regex where shared prefixes are matched only once."""
+    alternatives = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not alternatives:
+        return ""
+    ends_here = "" in node
+    if len(alternatives) == 1 and not ends_here:
+        return alternatives[0]
+    group = "(?:" + "|".join(alternatives) + ")"
+    return group + "?" if ends_here else group
+
+
+# Endings a keyword may carry as written ("codes", "drawing", "artwork")...
+KEYWORD_SUFFIXES = ("s", "es", "ing", "ings", "ed", "er", "ers", "al", "ation", "ations", "ist", "ists",
+                    "work", "works")
+# ...and the endings that follow a changed spelling of it ("coding", "programmer", "illustration", "stories").
+STEM_SUFFIXES = ("ing", "ings", "ed", "er", "ers", "or", "ors", "ion", "ions", "ies", "ied", "ize", "izes", "ized",
+                 "izing", "ation", "ations")
+
+
+def _trie(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return trie
+
+
+def keyword_stems(keywords):
+    """
+    Maps the other spellings keywords take before a suffix to the keywords themselves:
+    a dropped final "e" ("cod" for coding) or "y" ("stor" for stories) and a doubled final
+    consonant ("programm" for programming).
+    """
+    stems = {}
+    for keyword in keywords:
+        variants = set()
+        if keyword[-1:] in ("e", "y"):
+            variants.add(keyword[:-1])
+        if len(keyword) >= 3 and keyword[-1] not in "aeiouwxy" and keyword[-2] in "aeiou" \
+                and keyword[-3] not in "aeiou":
+            variants.add(keyword + keyword[-1])
+        for variant in variants - {keyword}:
+            if variant:
+                stems.setdefault(variant, []).append(keyword)
+    return stems
+
+
+def compile_keywords(keywords):
+    """
+    Compiles keywords into one case-insensitive regex that matches words starting with a keyword
+    and ending right there or in a common suffix (see KEYWORD_SUFFIXES and STEM_SUFFIXES).
+    Group 1 is a keyword as written; group 2 a spelling from keyword_stems().
+    Built from tries so thousands of keywords stay fast to scan.
+    """
+    keywords = list(keywords)
+    stems = keyword_stems(keywords)
+    pattern = r"\b(?:(" + _trie_pattern(_trie(keywords)) + r")(?:" + _trie_pattern(_trie(KEYWORD_SUFFIXES)) + r")?"
+    if stems:
+        pattern += r"|(" + _trie_pattern(_trie(stems)) + r")(?:" + _trie_pattern(_trie(STEM_SUFFIXES)) + r")"
+    return re.compile(pattern + r")\b", re.IGNORECASE)
+
+
+class GuildRouter:
+    """
+    Routes a request to a guild using every guild's "keywords" from guilds.json.
+    When several guilds match, the highest "priority" wins, then the most keyword hits,
+    then the guild listed first. Requests with no keyword hit go to the guild marked
+    "default" (or the first guild), unless the optional embedding fallback finds a guild
+    whose description is similar enough.
+    """
+
+    def __init__(self, guilds, semantic_fallback=False, similarity_threshold=0.25):
+        self.guild_names = [name for name in guilds if name != "rank_costs"]
+        self.guilds = guilds
+        self.semantic_fallback = semantic_fallback
+        self.similarity_threshold = similarity_threshold
+        self.default_guild = next((name for name in self.guild_names if guilds[name].get("default")),
+                                  self.guild_names[0])
+
+        self._keyword_guilds = {}
+        for name in self.guild_names:
+            for keyword in guilds[name].get("keywords", []):
+                self._keyword_guilds.setdefault(keyword.lower(), []).append(name)
+        self._pattern = compile_keywords(self._keyword_guilds) if self._keyword_guilds else None
+        self._stems = keyword_stems(self._keyword_guilds)
+        self._rank = {
+            name: (guilds[name].get("priority", 0), -order) for order, name in enumerate(self.guild_names)
+        }
+        self._description_embeddings = None  # Computed on the first fallback, then reused.
+
+    def route(self, user_request):
+        """Returns the name of the guild that should handle the request."""
+        hits = {}
+        if self._pattern:
+            for match in self._pattern.finditer(user_request):
+                keywords = [match.group(1).lower()] if match.group(1) else self._stems[match.group(2).lower()]
+                for name in {name for keyword in keywords for name in self._keyword_guilds[keyword]}:
+                    hits[name] = hits.get(name, 0) + 1
+        if hits:
+            return max(hits, key=lambda name: (self._rank[name][0], hits[name], self._rank[name][1]))
+        if self.semantic_fallback:
+            guild_name = self._route_by_similarity(user_request)
+            if guild_name:
+                return guild_name
+        return self.default_guild
+
+    def _route_by_similarity(self, user_request):
+        from memory import embed, cosine_distance
+        try:
+            if self._description_embeddings is None:
+                descriptions = [self._describe(name) for name in self.guild_names]
+                self._description_embeddings = dict(zip(self.guild_names, embed(descriptions)))
+            request_embedding = embed([user_request])[0]
+        except Exception as e:
+            print(f"Semantic routing unavailable: {e}")
+            return None
+        scores = {name: 1.0 - cosine_distance(request_embedding, embedding)
+                  for name, embedding in self._description_embeddings.items()}
+        best = max(scores, key=scores.get)
+        print(f"Router: no keyword match; closest guild is {best} (similarity {scores[best]:.2f}).")
+        return best if scores[best] >= self.similarity_threshold else None
+
+    def _describe(self, guild_name):
+        config = self.guilds[guild_name]
+        if config.get("description"):
+            return config["description"]
+        return " ".join(config.get("prompts", {}).values())
@@ -0,0 +1,202 @@
+# sandbox.py
+import atexit
+import io
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+try:
+    import resource  # Only available on Unix; without it runs are limited by the timeout alone.
+except ImportError:
+    resource = None
+
+DEFAULT_TIMEOUT = 10.0  # Wall-clock seconds per run.
+DEFAULT_CPU_SECONDS = 10  # CPU seconds per run.
+DEFAULT_MEMORY_LIMIT = 512 * 1024 * 1024  # Address space per worker, in bytes.
+DEFAULT_MAX_OUTPUT = 20000  # Characters kept from each of stdout and stderr.
+DEFAULT_MAX_RUNS = 50  # Runs before a worker is replaced with a fresh interpreter.
+DEFAULT_POOL_SIZE = 4  # Runs that can execute at the same time.
+
+
+class _CappedWriter(io.StringIO):
+    """A text stream that keeps only the first `limit` characters written to it."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.truncated = False
+
+    def write(self, text):
+        room = self.limit - self.tell()
+        if room <= 0:
+            self.truncated = self.truncated or bool(text)
+            return len(text)
+        if len(text) > room:
+            self.truncated = True
+            super().write(text[:room])
+        else:
+            super().write(text)
+        return len(text)
+
+
+def _read_captured(file, writer):
+    """Moves what was written to a captured file descriptor into `writer`, then empties the file."""
+    file.seek(0)
+    writer.write(file.read().decode("utf-8", errors="replace"))
+    file.seek(0)
+    file.truncate()
+
+
+def _worker_main(connection, memory_limit, max_output):
+    """Runs in a worker process: executes each code string it receives and sends back the outcome."""
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    # Only the soft CPU limit changes per run; lowering the hard limit could never be undone.
+    cpu_hard_limit = resource.getrlimit(resource.RLIMIT_CPU)[1] if resource is not None else None
+    # Output written straight to file descriptors 1 and 2 (subprocesses, sys.__stdout__) is captured
+    # too, instead of landing on the parent's stdout.
+    fd_files = (tempfile.TemporaryFile(), tempfile.TemporaryFile())
+    for fd, file in zip((1, 2), fd_files):
+        os.dup2(file.fileno(), fd)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        code, cpu_seconds = request
+        if resource is not None and cpu_seconds:
+            # RLIMIT_CPU counts the whole process, so each run gets a budget on top of what was used so far.
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            limit = math.ceil(usage.ru_utime + usage.ru_stime) + cpu_seconds
+            if cpu_hard_limit != resource.RLIM_INFINITY:
+                limit = min(limit, cpu_hard_limit)
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, cpu_hard_limit))
+
+        stdout, stderr = _CappedWriter(max_output), _CappedWriter(max_output)
+        error = None
+        try:
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                exec(code, {"__name__": "__main__"})
+        except BaseException:
+            error = traceback.format_exc(limit=5)[-max_output:]
+        for stream in (sys.__stdout__, sys.__stderr__):
+            if stream is not None:
+                stream.flush()
+        _read_captured(fd_files[0], stdout)
+        _read_captured(fd_files[1], stderr)
+        connection.send({
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+            "error": error,
+            "truncated": stdout.truncated or stderr.truncated,
+        })
+
+
+class _Worker:
+    def __init__(self, context, memory_limit, max_output):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, memory_limit, max_output),
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.runs = 0
+
+    def stop(self, force=False):
+        if not force:
+            try:
+                self.connection.send(None)
+                self.process.join(1)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self.connection.close()
+
+
+class SandboxPool:
+    """
+    A pool of pre-started Python interpreters for running agent code outside the Monarch process.
+    Each run gets a wall-clock timeout, CPU and memory limits and capped stdout/stderr capture.
+    Workers that time out, crash or hit a limit are killed and replaced; the others are reused,
+    so a run doesn't pay for interpreter start-up. Up to `size` runs execute in parallel.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, cpu_seconds=DEFAULT_CPU_SECONDS,
+                 memory_limit=DEFAULT_MEMORY_LIMIT, max_output=DEFAULT_MAX_OUTPUT, max_runs=DEFAULT_MAX_RUNS):
+        self.size = size
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_limit = memory_limit
+        self.max_output = max_output
+        self.max_runs = max_runs
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def warm(self):
+        """Starts every worker now instead of on the first run."""
+        with self._lock:
+            if not self._started:
+                for _ in range(self.size):
+                    self._idle.put(self._new_worker())
+                self._started = True
+                atexit.register(self.shutdown)
+
+    def _new_worker(self):
+        return _Worker(self._context, self.memory_limit, self.max_output)
+
+    def run(self, code, timeout=None):
+        """
+        Executes `code` in a worker and returns a dict with "stdout", "stderr", "error",
+        "truncated", "timed_out" and "duration". Blocks only the calling thread.
+        """
+        self.warm()
+        timeout = timeout or self.timeout
+        worker = self._idle.get()
+        start = time.monotonic()
+        result = None
+        crashed = False
+        try:
+            worker.connection.send((code, self.cpu_seconds))
+            if worker.connection.poll(timeout):
+                result = worker.connection.recv()
+                result["timed_out"] = False
+            else:
+                result = {"stdout": "", "stderr": "", "truncated": False, "timed_out": True,
+                          "error": f"Execution timed out after {timeout:g} seconds."}
+        except (EOFError, OSError):
+            # The worker died mid-run, usually from hitting its CPU or memory limit. It may not have
+            # been reaped yet, so is_alive() can't be trusted here.
+            crashed = True
+            result = {"stdout": "", "stderr": "", "truncated": False, "timed_out": False,
+                      "error": "The interpreter was killed, probably for exceeding its CPU or memory limit."}
+        finally:
+            worker.runs += 1
+            healthy = result is not None and not crashed and not result["timed_out"] and worker.process.is_alive()
+            if healthy and worker.runs < self.max_runs:
+                self._idle.put(worker)
+            else:
+                worker.stop(force=not healthy)
+                self._idle.put(self._new_worker())
+        result["duration"] = time.monotonic() - start
+        return result
+
+    def shutdown(self):
+        """Stops every idle worker."""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
@@ -0,0 +1,170 @@
+# scheduler.py
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from tracing import tracer
+
+# Per-model quotas. "rpm" is requests per minute, "tpm" tokens per minute; a missing key means unlimited.
+# Override with MONARCH_RATE_LIMITS, e.g. '{"gpt-4o": {"rpm": 5000, "tpm": 800000}}'.
+# Token quotas differ too much between accounts to guess, so none is applied unless one is set there;
+# until then 429s are left to the scheduler's retries.
+DEFAULT_LIMITS = {
+    "gpt-4o": {"rpm": 500},
+    "dall-e-3": {"rpm": 7},
+}
+
+
+class TokenBucket:
+    """Allows `rate_per_minute` units per minute, with bursts of up to one minute's worth."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.refill_rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full bucket)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.refill_rate)
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def adjust(self, amount):
+        """Returns (positive) or charges (negative) units once the real cost of a request is known."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def _load_limits():
+    limits = {model: dict(quota) for model, quota in DEFAULT_LIMITS.items()}
+    override = os.environ.get("MONARCH_RATE_LIMITS")
+    if override:
+        for model, quota in json.loads(override).items():
+            limits.setdefault(model, {}).update(quota)
+    return limits
+
+
+def _is_retryable(error):
+    """Rate limits, server errors and dropped connections are worth retrying; anything else is not."""
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error):
+    """The server's requested delay in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Central gate for every OpenAI call. Each model has token buckets for requests and tokens
+    per minute; callers wait in a per-model priority queue (highest priority first, then
+    arrival order) until both buckets have room, so throughput sits at the quota instead of
+    bursting into 429s. Rate-limit and server errors are retried with jittered exponential
+    backoff, re-entering the queue at the same priority.
+    """
+
+    def __init__(self, limits=None, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.limits = limits if limits is not None else _load_limits()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._buckets = {}
+        self._waiting = {}  # model -> heap of (-priority, seq)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+
+    def _buckets_for(self, model):
+        if model not in self._buckets:
+            quota = self.limits.get(model, {})
+            self._buckets[model] = (
+                TokenBucket(quota["rpm"]) if quota.get("rpm") else None,
+                TokenBucket(quota["tpm"]) if quota.get("tpm") else None,
+            )
+        return self._buckets[model]
+
+    def _acquire(self, model, tokens, priority):
+        """Blocks until this request is first in its model's queue and fits the quota. Returns the wait in seconds."""
+        start = time.monotonic()
+        entry = (-priority, next(self._seq))
+        with self._condition:
+            request_bucket, token_bucket = self._buckets_for(model)
+            queue = self._waiting.setdefault(model, [])
+            heapq.heappush(queue, entry)
+            while True:
+                if queue[0] != entry:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                delay = max(request_bucket.wait_time(1, now) if request_bucket else 0.0,
+                            token_bucket.wait_time(tokens, now) if token_bucket else 0.0)
+                if delay <= 0:
+                    if request_bucket:
+                        request_bucket.take(1)
+                    if token_bucket:
+                        token_bucket.take(tokens)
+                    heapq.heappop(queue)
+                    self._condition.notify_all()
+                    return time.monotonic() - start
+                self._condition.wait(delay)
+
+    def _reconcile(self, model, estimated_tokens, usage):
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            return
+        with self._condition:
+            token_bucket = self._buckets_for(model)[1]
+            if token_bucket:
+                token_bucket.adjust(estimated_tokens - actual)
+                self._condition.notify_all()
+
+    def call(self, model, request_fn, estimated_tokens=0, priority=0, consume=None):
+        """
+        Runs `request_fn()` once the model's quota allows it, retrying retryable errors.
+        Higher `priority` values are served first. Raises the last error if every retry fails.
+        A streamed response is read by `consume(response, attempt)`, which returns (result, usage):
+        errors while reading it are retried like any other, and the quota is corrected from `usage`.
+        """
+        for attempt in range(self.max_retries + 1):
+            # Queue wait and retries are charged to the caller's current span (the LLM call when tracing).
+            tracer.current().add(queue_wait_s=self._acquire(model, estimated_tokens, priority))
+            try:
+                response = request_fn()
+                usage = getattr(response, "usage", None)
+                if consume:
+                    response, usage = consume(response, attempt)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                # Full jitter keeps many waiting callers from retrying in lockstep.
+                delay = _retry_after(e) or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self.retries += 1
+                tracer.current().add(retries=1)
+                print(f"Scheduler: {model} request failed ({e.__class__.__name__}). Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+            self._reconcile(model, estimated_tokens, usage)
+            return response
+
+
+# The shared scheduler used by every agent.
+request_scheduler = RequestScheduler()
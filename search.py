@@ -0,0 +1,181 @@
+# search.py
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def normalize_query(query):
+    """Lowercases and collapses whitespace so trivially different queries share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+class SearchBackend(ABC):
+    """A source of web search results. `search` returns a list of {"title", "snippet", "link"} dicts."""
+
+    name = "base"
+
+    @abstractmethod
+    def search(self, query, num_results=5):
+        ...
+
+
+class SerpApiBackend(SearchBackend):
+    """Google results through SerpApi, over one pooled HTTP session with a request timeout."""
+
+    name = "serpapi"
+    ENDPOINT = "https://serpapi.com/search.json"
+
+    def __init__(self, api_key=None, timeout=10.0, pool_size=8):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        return self._session
+
+    def search(self, query, num_results=5):
+        api_key = self.api_key or os.environ.get("SERPAPI_API_KEY")
+        if not api_key:
+            raise RuntimeError("SERPAPI_API_KEY is not set. Add it to .env, or set MONARCH_SEARCH_BACKEND=fixture.")
+        params = {
+            "api_key": api_key,
+            "engine": "google",
+            "q": query,
+            "num": num_results,
+        }
+        response = self._get_session().get(self.ENDPOINT, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+
+        results = []
+        answer = data.get("answer_box")
+        if answer:
+            results.append({
+                "title": answer.get("title", "Answer"),
+                "snippet": answer.get("answer") or answer.get("snippet") or str(answer),
+                "link": answer.get("link", ""),
+            })
+        for item in data.get("organic_results", []):
+            results.append({"title": item.get("title", ""), "snippet": item.get("snippet", ""),
+                            "link": item.get("link", "")})
+        return results[:num_results]
+
+
+class FixtureBackend(SearchBackend):
+    """
+    Offline results for tests and benchmarks. Reads an optional JSON file mapping queries to
+    result lists; queries without a fixture get a deterministic stub result.
+    """
+
+    name = "fixture"
+
+    def __init__(self, path=None, latency=0.0):
+        self.latency = latency
+        self.fixtures = {}
+        if path:
+            with open(path, 'r') as f:
+                self.fixtures = {normalize_query(query): results for query, results in json.load(f).items()}
+
+    def search(self, query, num_results=5):
+        if self.latency:
+            time.sleep(self.latency)
+        results = self.fixtures.get(normalize_query(query))
+        if results is None:
+            results = [{"title": f"Offline result for '{query}'",
+                        "snippet": f"No fixture is recorded for '{query}'.", "link": ""}]
+        return results[:num_results]
+
+
+def default_backend():
+    """Chooses a backend from MONARCH_SEARCH_BACKEND ("serpapi" or "fixture") and MONARCH_SEARCH_FIXTURES."""
+    if os.environ.get("MONARCH_SEARCH_BACKEND", "serpapi") == "fixture":
+        return FixtureBackend(os.environ.get("MONARCH_SEARCH_FIXTURES"))
+    return SerpApiBackend()
+
+
+class SearchService:
+    """
+    Front end for a search backend with a TTL result cache keyed by the normalized query,
+    in-flight deduplication (concurrent identical searches share one backend request) and
+    parallel fan-out for multi-query searches.
+    """
+
+    def __init__(self, backend=None, ttl=3600.0, max_entries=1024, max_workers=4):
+        self._backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # Searches answered by another caller's in-flight request.
+        self._cache = OrderedDict()  # key -> (stored_at, results)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = default_backend()
+        return self._backend
+
+    def search(self, query, num_results=3):
+        """Returns up to `num_results` results for the query, from the cache when possible."""
+        key = (normalize_query(query), num_results)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] <= self.ttl:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if owner:
+            try:
+                results = self.backend.search(query, num_results)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(results)
+                with self._lock:
+                    self._cache[key] = (time.monotonic(), results)
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+        return future.result()
+
+    def search_many(self, queries, num_results=3):
+        """Runs several searches in parallel; returns {query: results or the exception raised}."""
+        def search_one(query):
+            try:
+                return self.search(query, num_results)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(queries)))) as executor:
+            return dict(zip(queries, executor.map(search_one, queries)))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "shared": self.shared}
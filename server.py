@@ -0,0 +1,211 @@
+# server.py
+import json
+import re
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from job_queue import JobQueue, COMPLETED, FAILED, JOB_RETENTION, MAX_FINISHED_JOBS, job_error
+from memory import flush as flush_memories
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Seconds between writes of changed agents to the army store (jobs also save after every step)
+# and of buffered memories to the memory database.
+SNAPSHOT_INTERVAL = 60.0
+JOB_PATH = re.compile(r"^/jobs/(\w+)$")
+# Spans kept by the tracer in server mode; older ones are dropped so a long-running server doesn't grow.
+MAX_TRACE_SPANS = 100000
+# Seconds a client waits for a job to finish before giving up on it.
+WAIT_TIMEOUT = 3600.0
+
+
+class MonarchServer:
+    """
+    Keeps one warm Monarch (guilds, army, clients and caches loaded once) and runs jobs from a
+    persistent queue on `workers` threads. Jobs are submitted and polled over a small local
+    HTTP API:
+
+      POST /jobs       {"prompt": "...", "budget": 200}  -> 202 {"id": "...", "status": "QUEUED"}
+      GET  /jobs/<id>  the job's status, and its result and history once finished
+      GET  /health     queue counts and army size
+      POST /shutdown   stop accepting work, finish running jobs, save the army and exit
+
+    Finished jobs are kept for `job_retention` seconds (at most `max_finished_jobs` of them).
+    """
+
+    def __init__(self, monarch_controller, queue_path="monarch_jobs.db", host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 workers=4, snapshot_interval=SNAPSHOT_INTERVAL, job_retention=JOB_RETENTION,
+                 max_finished_jobs=MAX_FINISHED_JOBS):
+        self.monarch = monarch_controller
+        self.queue = JobQueue(queue_path)
+        self.workers = workers
+        self.snapshot_interval = snapshot_interval
+        self.job_retention = job_retention
+        self.max_finished_jobs = max_finished_jobs
+        self.started_at = time.time()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._http = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._http.daemon_threads = True
+        self._http.monarch_server = self
+
+    @property
+    def address(self):
+        host, port = self._http.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve(self):
+        """Runs until SIGTERM, SIGINT or POST /shutdown, then shuts down gracefully."""
+        for number in range(self.workers):
+            self._start_thread(self._work, f"monarch-worker-{number + 1}")
+        self.queue.prune(self.job_retention, self.max_finished_jobs)
+        self._start_thread(self._snapshot, "monarch-snapshot")
+        http_thread = threading.Thread(target=self._http.serve_forever, name="monarch-http", daemon=True)
+        http_thread.start()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *_: self.stop())
+        print(f"Monarch server listening on {self.address} with {self.workers} workers.")
+
+        self._stopping.wait()
+        print("Monarch server: shutting down. Waiting for running jobs to finish...")
+        self._http.shutdown()
+        self.queue.wake_all()
+        for thread in self._threads:
+            thread.join()
+        self.monarch.save_army()
+        self.queue.close()
+        self._http.server_close()
+        print("Monarch server stopped.")
+
+    def stop(self):
+        """Asks the server to shut down; safe to call from signal handlers and request threads."""
+        self._stopping.set()
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self.queue.claim(timeout=1.0)
+            if job is None:
+                continue
+            print(f"Monarch server: starting job {job['id']}.")
+            try:
+                final_product, history, _ = self.monarch.execute_job(job["prompt"], job["budget"])
+                self.queue.finish(job["id"], final_product, history)
+            except Exception as e:
+                self.queue.finish(job["id"], None, [], error=f"{e.__class__.__name__}: {e}")
+            print(f"Monarch server: finished job {job['id']}.")
+
+    def _snapshot(self):
+        while not self._stopping.wait(self.snapshot_interval):
+            self.monarch.flush_army()
+            flush_memories()
+            pruned = self.queue.prune(self.job_retention, self.max_finished_jobs)
+            if pruned:
+                print(f"Monarch server: pruned {pruned} finished jobs.")
+
+    def health(self):
+        return {"status": "stopping" if self._stopping.is_set() else "ok",
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "workers": self.workers, "jobs": self.queue.counts(), "agents_loaded": len(self.monarch.army)}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server.monarch_server
+        if self.path == "/health":
+            self._send(200, server.health())
+            return
+        match = JOB_PATH.match(self.path)
+        job = server.queue.get(match.group(1)) if match else None
+        if job is None:
+            self._send(404, {"error": f"No such job or path: {self.path}"})
+        else:
+            self._send(200, job)
+
+    def do_POST(self):
+        server = self.server.monarch_server
+        if self.path == "/shutdown":
+            self._send(202, {"status": "stopping"})
+            server.stop()
+            return
+        if self.path != "/jobs":
+            self._send(404, {"error": f"No such path: {self.path}"})
+            return
+        if server._stopping.is_set():
+            self._send(503, {"error": "The server is shutting down."})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt, budget = body.get("prompt"), body.get("budget", 200)
+            error = job_error(prompt, budget)
+        except (ValueError, AttributeError) as e:
+            error = f"Expected a JSON object: {e}"
+        if error:
+            self._send(400, {"error": error})
+            return
+        job_id = server.queue.submit(prompt, budget)
+        self._send(202, {"id": job_id, "status": "QUEUED"})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MonarchClient:
+    """Talks to a running Monarch server, so the CLI can submit jobs without loading anything itself."""
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read() or b"{}").get("error", str(e))) from None
+        except (urllib.error.URLError, TimeoutError) as e:
+            reason = getattr(e, "reason", e)
+            raise ConnectionError(f"Could not reach the Monarch server at {self.url}: {reason}") from None
+
+    def submit(self, prompt, budget=200):
+        """Queues a job and returns its id."""
+        return self._request("POST", "/jobs", {"prompt": prompt, "budget": budget})["id"]
+
+    def get(self, job_id):
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def wait(self, job_id, poll_interval=1.0, timeout=WAIT_TIMEOUT):
+        """Polls until the job has finished and returns it; raises TimeoutError after `timeout` seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job["status"] in (COMPLETED, FAILED):
+                return job
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                raise TimeoutError(f"Job {job_id} did not finish within {timeout:g} s (it is {job['status']}).")
+            time.sleep(poll_interval)
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def shutdown(self):
+        return self._request("POST", "/shutdown")
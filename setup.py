@@ -4,11 +4,11 @@ from setuptools import setup
 setup(
     name='project-monarch',
     version='1.0.0',
-    py_modules=['main', 'agent', 'monarch', 'job', 'tools', 'memory'],
+    py_modules=['main', 'agent', 'monarch', 'job', 'tools', 'memory', 'workflow', 'cache', 'roster', 'army_store', 'router', 'sandbox', 'search', 'scheduler', 'tracing', 'artifacts', 'context', 'job_cache', 'job_queue', 'server'],
     install_requires=[
         'openai',
         'python-dotenv',
-        'google-search-results',
+        'requests',
         'chromadb',
         'sentence-transformers',
     ],
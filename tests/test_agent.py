@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+import pytest
+import agent
+from cache import response_cache
+from scheduler import RequestScheduler
+
+
+def chunk(text=None, tool_calls=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text, tool_calls=tool_calls))] \
+        if text or tool_calls else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def tool_fragment(index, call_id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+@pytest.fixture
+def fake_stream(monkeypatch):
+    """Serves the given chunks as the model's streamed answer, with the response cache off."""
+    monkeypatch.setattr(response_cache, "mode", "off")
+    monkeypatch.setattr(agent, "request_scheduler", RequestScheduler(limits={}))
+
+    def serve(chunks):
+        create = lambda **request: iter(chunks)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(agent, "get_client", lambda: client)
+    return serve
+
+
+def test_streamed_text_reaches_on_token(fake_stream):
+    fake_stream([chunk("Hel"), chunk("lo"), chunk(usage=SimpleNamespace(prompt_tokens=3, completion_tokens=2,
+                                                                         total_tokens=5))])
+    pieces = []
+    reply = agent.complete(on_token=pieces.append, model="gpt-4o", messages=[])
+    assert pieces == ["Hel", "lo"]
+    assert reply == {"role": "assistant", "content": "Hello"}
+
+
+def test_tool_calls_are_rebuilt_from_stream_fragments(fake_stream):
+    fake_stream([
+        chunk(tool_calls=[tool_fragment(0, "call_a", "web_search", '{"que'),
+                          tool_fragment(1, "call_b", "run_python", '{"code"')]),
+        chunk(tool_calls=[tool_fragment(0, arguments='ry": "tides"}'), tool_fragment(1, arguments=': "1+1"}')]),
+    ])
+    reply = agent.complete(on_token=lambda text: None, model="gpt-4o", messages=[])
+    assert reply["content"] is None
+    assert reply["tool_calls"] == [
+        {"id": "call_a", "type": "function", "function": {"name": "web_search", "arguments": '{"query": "tides"}'}},
+        {"id": "call_b", "type": "function", "function": {"name": "run_python", "arguments": '{"code": "1+1"}'}},
+    ]
+
+
+def tool_call(call_id, name, arguments):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+
+
+@pytest.fixture
+def scripted_agent(monkeypatch):
+    """An agent whose model calls return the given replies in order; each request is recorded."""
+    monkeypatch.setattr(agent, "recall", lambda query: [])
+    monkeypatch.setitem(agent.AVAILABLE_TOOLS, "echo", lambda text: f"echo: {text}")
+    requests = []
+
+    def make(*replies):
+        replies = list(replies)
+
+        def complete(on_token=None, priority=0, **request):
+            requests.append({**request, "messages": list(request["messages"])})
+            return replies.pop(0)
+
+        monkeypatch.setattr(agent, "complete", complete)
+        return agent.ShadowAgent("W-001", "C", "Writer", {"prompts": {}})
+    return make, requests
+
+
+def test_answer_without_tools_takes_one_call(scripted_agent):
+    make, requests = scripted_agent
+    assert make({"role": "assistant", "content": "done"}).perform_task("task") == "done"
+    assert len(requests) == 1 and "tool_choice" not in requests[0]
+
+
+def test_tool_results_are_sent_back(scripted_agent):
+    make, requests = scripted_agent
+    call = tool_call("call_1", "echo", '{"text": "hi"}')
+    worker = make({"role": "assistant", "content": None, "tool_calls": [call]},
+                  {"role": "assistant", "content": "answer"})
+    assert worker.perform_task("task") == "answer"
+    assert requests[1]["messages"][-1] == {"role": "tool", "tool_call_id": "call_1", "content": "echo: hi"}
+
+
+def test_bad_arguments_and_unknown_tools_are_reported_to_the_model(scripted_agent):
+    make, requests = scripted_agent
+    worker = make({"role": "assistant", "content": None,
+                   "tool_calls": [tool_call("a", "echo", "{not json"), tool_call("b", "teleport", "{}")]},
+                  {"role": "assistant", "content": "answer"})
+    assert worker.perform_task("task") == "answer"
+    bad_json, unknown = requests[1]["messages"][-2:]
+    assert "Could not parse the arguments for 'echo'" in bad_json["content"]
+    assert "Unknown tool 'teleport'" in unknown["content"]
+
+
+def test_tool_rounds_are_capped_then_a_plain_answer_is_forced(scripted_agent):
+    make, requests = scripted_agent
+    asking = {"role": "assistant", "content": None, "tool_calls": [tool_call("c", "echo", '{"text": "again"}')]}
+    worker = make(*[asking] * agent.MAX_TOOL_ROUNDS, {"role": "assistant", "content": "final"})
+    assert worker.perform_task("task") == "final"
+    assert len(requests) == agent.MAX_TOOL_ROUNDS + 1
+    assert requests[-1]["tool_choice"] == "none"
@@ -0,0 +1,49 @@
+import json
+import os
+from army_store import JsonArmyStore, SQLiteArmyStore, open_army_store
+
+
+def record(agent_id, specialty="Writer", rank="F", xp=0):
+    return {"agent_id": agent_id, "specialty": specialty, "rank": rank, "xp": xp}
+
+
+def test_store_is_chosen_by_file_name(tmp_path):
+    assert isinstance(open_army_store(str(tmp_path / "army.json")), JsonArmyStore)
+    assert isinstance(open_army_store(str(tmp_path / "army.db")), SQLiteArmyStore)
+
+
+def test_sqlite_upserts_and_loads_by_specialty(tmp_path):
+    store = SQLiteArmyStore(str(tmp_path / "army.db"))
+    store.save([record("W-001"), record("W-002"), record("R-001", "Researcher")])
+    store.save([record("W-001", rank="E", xp=200)])
+    assert store.count() == 3
+    assert sorted(r["agent_id"] for r in store.load("Writer")) == ["W-001", "W-002"]
+    assert {r["agent_id"]: r["xp"] for r in store.load()}["W-001"] == 200
+    assert store.contains("R-001") and not store.contains("R-002")
+
+
+def test_max_id_number_only_counts_matching_prefixes(tmp_path):
+    store = SQLiteArmyStore(str(tmp_path / "army.db"))
+    store.save([record("W-007"), record("W-012"), record("WX-099"), record("W-legacy")])
+    assert store.max_id_number("W-") == 12
+    assert store.max_id_number("R-") == 0
+
+
+def test_json_store_is_rewritten_atomically(tmp_path, monkeypatch):
+    path = tmp_path / "army.json"
+    store = JsonArmyStore(str(path))
+    store.save([record("W-001")])
+
+    def crash(source, destination):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", crash)
+    try:
+        store.save([record("W-002")])
+    except OSError:
+        pass
+    # The interrupted save left the previous file whole.
+    assert list(json.loads(path.read_text())) == ["W-001"]
+    monkeypatch.undo()
+    store.save([record("W-002")])
+    assert sorted(JsonArmyStore(str(path)).load(), key=lambda r: r["agent_id"]) == [record("W-001"), record("W-002")]
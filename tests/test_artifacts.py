@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+from artifacts import ArtifactStore, SpilledArtifact, paragraphs, preview
+from context import split_into_chunks
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_text(paragraph_count=40):
+    return "\n\n".join(f"Paragraph {n}: " + "é words " * 50 for n in range(paragraph_count))
+
+
+def test_small_artifacts_stay_in_memory(tmp_path):
+    store = ArtifactStore(str(tmp_path), spill_threshold=1024)
+    assert store.put("short") == "short"
+    assert store.stats()["spilled"] == 0
+
+
+def test_large_artifacts_spill_and_read_back(tmp_path):
+    store = ArtifactStore(str(tmp_path), spill_threshold=1024)
+    text = make_text()
+    artifact = store.put(text)
+    assert isinstance(artifact, SpilledArtifact)
+    assert str(artifact) == text
+    assert len(artifact) == len(text)
+    assert preview(artifact, 20) == text[:20] + "..."
+    assert list(paragraphs(artifact)) == text.split("\n\n")
+    assert split_into_chunks(paragraphs(artifact), 200) == split_into_chunks(text, 200)
+
+
+def test_shared_artifact_is_deleted_after_the_last_release(tmp_path):
+    store = ArtifactStore(str(tmp_path), spill_threshold=1024)
+    text = make_text()
+    first, second = store.put(text), store.put(text)
+    assert first is second
+    assert store.stats()["deduplicated"] == 1
+
+    store.release([first, "not spilled"])
+    assert os.path.exists(first.path)
+    store.release([second])
+    assert not os.path.exists(second.path)
+    assert store.stats()["removed"] == 1
+
+    again = store.put(text)  # Spilled anew once every job has let go of it.
+    assert str(again) == text
+    assert store.stats()["spilled"] == 2
+
+
+def test_other_processes_keep_their_own_copy(tmp_path):
+    store = ArtifactStore(str(tmp_path), spill_threshold=1024)
+    text = make_text()
+    artifact = store.put(text)
+    # Another process (a server next to a CLI batch, say) spills the same output.
+    script = ("import sys; from artifacts import ArtifactStore; "
+              "print(ArtifactStore(sys.argv[1], spill_threshold=1024).put(sys.argv[2]).path)")
+    other = subprocess.run([sys.executable, "-c", script, str(tmp_path), text], capture_output=True, text=True,
+                           cwd=REPO, check=True).stdout.strip()
+    assert other != artifact.path
+    store.release([artifact])
+    assert not os.path.exists(artifact.path)
+    assert os.path.exists(other)
+
+
+def test_files_of_dead_processes_are_removed(tmp_path):
+    orphan = tmp_path / "999999999" / "ab"
+    orphan.mkdir(parents=True)
+    (orphan / "abcdef").write_text("left behind by a crash")
+    ArtifactStore(str(tmp_path), spill_threshold=1024).put(make_text())
+    assert not (tmp_path / "999999999").exists()
@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import shutil
+
+import pytest
+
+from main import read_batch
+
+REPO_GUILDS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "guilds.json")
+
+
+def test_read_batch_accepts_strings_and_objects():
+    jobs = list(read_batch(io.StringIO('"first"\n\n{"prompt": "second", "id": "b", "budget": 50}\n')))
+    assert jobs == [{"prompt": "first", "id": 1}, {"prompt": "second", "id": "b", "budget": 50}]
+
+
+def test_read_batch_reports_bad_lines_instead_of_raising():
+    source = io.StringIO('not json\n{"id": 7}\n[1, 2]\n{"prompt": 3}\n"fine"\n')
+    jobs = list(read_batch(source))
+    assert [job["id"] for job in jobs] == [1, 7, 3, 4, 5]
+    assert "not valid JSON" in jobs[0]["error"]
+    assert "prompt" in jobs[1]["error"]
+    assert "JSON object or string" in jobs[2]["error"]
+    assert "prompt" in jobs[3]["error"]
+    assert "error" not in jobs[4]
+
+
+@pytest.fixture
+def monarch_controller(tmp_path, monkeypatch):
+    from monarch import Monarch
+    shutil.copy(REPO_GUILDS, tmp_path / "guilds.json")
+    controller = Monarch(army_file=str(tmp_path / "army.db"), guild_config_file=str(tmp_path / "guilds.json"))
+    # Prompts starting with "rough" stand for jobs only a best-effort step could answer.
+    monkeypatch.setattr(controller, "execute_job", lambda prompt, budget=200: (
+        f"done: {prompt}", [prompt], "BEST_EFFORT" if prompt.startswith("rough") else "COMPLETED"))
+    return controller
+
+
+def test_execute_batch_keeps_going_past_invalid_jobs(monarch_controller):
+    jobs = [{"id": 1, "prompt": "a"}, {"id": 2}, {"id": 3, "prompt": "b", "budget": "lots"},
+            {"id": 4, "error": "Line 4 is not valid JSON"}, {"id": 5, "prompt": "c"}]
+    results = {job["id"]: (final_product, history)
+               for job, final_product, history, status in monarch_controller.execute_batch(jobs, concurrency=2)}
+    assert results[1][0] == "done: a"
+    assert results[5][0] == "done: c"
+    assert results[2][0] is None and "prompt" in results[2][1][0]
+    assert results[3][0] is None and "budget" in results[3][1][0]
+    assert results[4] == (None, ["Line 4 is not valid JSON"])
+
+
+def test_run_batch_writes_an_error_record_per_bad_line(monarch_controller, tmp_path, capsys):
+    from main import run_batch
+    batch = tmp_path / "jobs.jsonl"
+    batch.write_text('"a"\n{"id": 7}\n{broken\n"b"\n"rough guess"\n')
+    run_batch(monarch_controller, str(batch), concurrency=2)
+    records = {record["id"]: record for record in map(json.loads, capsys.readouterr().out.splitlines())}
+    assert records[1]["status"] == records[4]["status"] == "COMPLETED"
+    assert records[7]["status"] == records[3]["status"] == "FAILED"
+    assert records[5]["status"] == "BEST_EFFORT"
+    assert "prompt" in records[7]["error"]
+    assert "not valid JSON" in records[3]["error"]
@@ -0,0 +1,57 @@
+import time
+import cache
+from cache import ResponseCache
+
+
+def entries(store):
+    return store._connect().execute("SELECT key FROM responses ORDER BY key").fetchall()
+
+
+def test_get_returns_what_was_set(tmp_path):
+    store = ResponseCache(path=str(tmp_path / "responses.db"))
+    key = store.make_key({"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]})
+    assert store.get(key) is None
+    store.set(key, {"content": "hello"})
+    assert store.get(key) == {"content": "hello"}
+    assert store.stats()["hits"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = ResponseCache(path=str(tmp_path / "responses.db"), max_entries=3)
+    for key in "abc":
+        store.set(key, key)
+        time.sleep(0.01)
+    store.get("a")
+    store.set("d", "d")
+    assert entries(store) == [("a",), ("c",), ("d",)]
+    assert store._size[0] == 3
+
+
+def test_replacing_an_entry_is_not_counted_twice(tmp_path):
+    store = ResponseCache(path=str(tmp_path / "responses.db"), max_entries=2)
+    store.set("a", "x")
+    store.set("a", "xxxx")
+    store.set("b", "y")
+    assert entries(store) == [("a",), ("b",)]
+    assert store._size == [2, len('"xxxx"') + len('"y"')]
+
+
+def test_expired_entries_go_before_live_ones(tmp_path):
+    store = ResponseCache(path=str(tmp_path / "responses.db"), max_entries=2, ttl=60)
+    store.set("old", "old")
+    store._connect().execute("UPDATE responses SET created_at = created_at - 120")
+    store.set("a", "a")
+    store.set("b", "b")
+    assert entries(store) == [("a",), ("b",)]
+
+
+def test_size_is_recounted_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "RECOUNT_INTERVAL", 2)
+    store = ResponseCache(path=str(tmp_path / "responses.db"))
+    store.set("a", "a")
+    # Another process sharing the file adds an entry this one doesn't know about.
+    store._connect().execute("INSERT INTO responses VALUES ('z', '\"z\"', 3, ?, ?)", (time.time(), time.time()))
+    store.set("b", "b")
+    assert store._size[0] == 2
+    store.set("c", "c")
+    assert store._size[0] == 4
@@ -0,0 +1,111 @@
+import os
+import shutil
+import time
+import pytest
+import job_cache as job_cache_module
+from job_cache import JobCache
+
+REPO_GUILDS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "guilds.json")
+
+
+class FakeCollection:
+    """Enough of a Chroma collection for the job cache: exact-text "embeddings" and simple filters."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def count(self):
+        return len(self.rows)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for key, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.rows[key] = (embedding, document, metadata)
+
+    def query(self, query_embeddings, n_results, where, include):
+        rows = [row for row in self.rows.values() if _matches(row[2], where)]
+        rows.sort(key=lambda row: row[0] != query_embeddings[0])
+        rows = rows[:n_results]
+        return {"documents": [[row[1] for row in rows]], "metadatas": [[row[2] for row in rows]],
+                "distances": [[0.0 if row[0] == query_embeddings[0] else 0.5 for row in rows]]}
+
+
+def _matches(metadata, where):
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    (key, condition), = where.items()
+    if isinstance(condition, dict):
+        return key in metadata and metadata[key] >= condition["$gte"]
+    return metadata.get(key) == condition
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(job_cache_module, "embed", lambda texts: [[text] for text in texts])
+    cache = JobCache(enabled=True)
+    cache._collection = FakeCollection()
+    return cache
+
+
+def test_lookup_finds_stored_deliverables_per_guild(cache):
+    cache.store("write a poem", "Writer", "roses are red", "job1")
+    outcome, similarity, match = cache.lookup("write a poem", "Writer")
+    assert (outcome, similarity, match["result"], match["job_id"]) == ("hit", 1.0, "roses are red", "job1")
+    assert match["created_at"] <= time.time()
+    assert cache.lookup("write a poem", "Coder")[0] == "miss"
+
+
+def test_ttl_hides_old_deliverables(cache):
+    cache.store("write a poem", "Writer", "roses are red", "job1")
+    key, (embedding, document, metadata) = next(iter(cache._collection.rows.items()))
+    metadata["created_at"] -= 120
+    cache.ttl = 60
+    assert cache.lookup("write a poem", "Writer") == ("miss", None, None)
+    cache.ttl = None
+    assert cache.lookup("write a poem", "Writer")[0] == "hit"
+
+
+@pytest.mark.parametrize("status, stored", [("COMPLETED", True), ("BEST_EFFORT", False)])
+def test_only_full_workflow_results_are_stored(tmp_path, monkeypatch, status, stored):
+    from monarch import Monarch, job_cache
+    shutil.copy(REPO_GUILDS, tmp_path / "guilds.json")
+    controller = Monarch(army_file=str(tmp_path / "army.db"), guild_config_file=str(tmp_path / "guilds.json"))
+
+    def execute_workflow(job, guild_name, guild_config, on_token=None):
+        job.status = status
+        return "the deliverable", []
+
+    stores = []
+    monkeypatch.setattr(controller, "_execute_workflow", execute_workflow)
+    monkeypatch.setattr(job_cache, "enabled", True)
+    monkeypatch.setattr(job_cache, "lookup", lambda request, guild: ("miss", None, None))
+    monkeypatch.setattr(job_cache, "store", lambda *args: stores.append(args))
+    assert controller.execute_job("Write a report on tides")[0] == "the deliverable"
+    assert bool(stores) == stored
+
+
+def test_similarity_stats_are_running_totals(cache):
+    cache.store("write a poem", "Writer", "roses are red", "job1")
+    cache.lookup("write a poem", "Writer")
+    cache.lookup("write a sonnet", "Writer")
+    stats = cache.stats()
+    assert (stats["mean_similarity"], stats["max_similarity"]) == (0.75, 1.0)
+    assert not hasattr(cache, "similarities")
+
+
+@pytest.mark.parametrize("polish_result, polished, misses", [("adapted", 1, 0), (None, 0, 1)])
+def test_polish_counts_only_once_it_succeeds(tmp_path, monkeypatch, polish_result, polished, misses):
+    from monarch import Monarch
+    shutil.copy(REPO_GUILDS, tmp_path / "guilds.json")
+    controller = Monarch(army_file=str(tmp_path / "army.db"), guild_config_file=str(tmp_path / "guilds.json"))
+    cache = JobCache(enabled=True)
+    monkeypatch.setattr("monarch.job_cache", cache)
+    match = {"request": "old", "result": "old deliverable", "job_id": "job0", "created_at": 0}
+    monkeypatch.setattr(cache, "lookup", lambda request, guild: ("polish", 0.9, match))
+    monkeypatch.setattr(cache, "store", lambda *args: None)
+    monkeypatch.setattr(controller, "_polish_deliverable", lambda *args: polish_result)
+    monkeypatch.setattr(controller, "_execute_workflow", lambda *args: ("from scratch", []))
+    monkeypatch.setattr("monarch.memorize", lambda job_id, content: None)
+
+    final_product, _, _ = controller.execute_job("Write a report on tides")
+    assert final_product == (polish_result or "from scratch")
+    assert (cache.polished, cache.misses) == (polished, misses)
@@ -0,0 +1,45 @@
+import time
+from job_queue import JobQueue, QUEUED, RUNNING, COMPLETED, FAILED
+
+
+def test_jobs_are_claimed_in_order_and_finished(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    first, second = queue.submit("first"), queue.submit("second", budget=50)
+    assert queue.claim(timeout=0)["id"] == first
+    job = queue.claim(timeout=0)
+    assert (job["id"], job["budget"], job["status"]) == (second, 50, RUNNING)
+    assert queue.claim(timeout=0) is None
+
+    queue.finish(first, "done", ["step"])
+    queue.finish(second, None, [], error="boom")
+    assert queue.get(first)["status"] == COMPLETED
+    assert queue.get(first)["history"] == ["step"]
+    assert (queue.get(second)["status"], queue.get(second)["error"]) == (FAILED, "boom")
+
+
+def test_running_jobs_are_requeued_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    queue = JobQueue(path)
+    job_id = queue.submit("interrupted")
+    queue.claim(timeout=0)
+    queue.close()
+    queue = JobQueue(path)
+    assert queue.get(job_id)["status"] == QUEUED
+    assert queue.claim(timeout=0)["id"] == job_id
+
+
+def test_prune_drops_old_and_excess_finished_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    ids = [queue.submit(f"job {n}") for n in range(5)]
+    for job_id in ids[:4]:
+        queue.claim(timeout=0)
+        queue.finish(job_id, "done", [])
+    with queue._connection:
+        queue._connection.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", (time.time() - 100, ids[0]))
+
+    assert queue.prune(max_age=50, max_finished=None) == 1
+    assert queue.get(ids[0]) is None
+    assert queue.prune(max_age=None, max_finished=2) == 1
+    assert queue.get(ids[1]) is None
+    assert queue.get(ids[4])["status"] == QUEUED  # Unfinished jobs are never pruned.
+    assert queue.counts()[COMPLETED] == 2
@@ -0,0 +1,16 @@
+from main import make_token_printer, print_deliverable
+
+
+def test_token_printer_knows_what_it_streamed(capsys):
+    on_token = make_token_printer()
+    on_token("draft", "Hello ")
+    on_token("draft", "world")
+    assert "--- STREAMING: draft ---\nHello world" in capsys.readouterr().out
+    assert on_token.streamed("Hello world")
+    assert not on_token.streamed("https://images/cat.png")
+
+
+def test_deliverable_that_was_not_streamed_is_printed(capsys):
+    on_token = make_token_printer()
+    print_deliverable("https://images/cat.png", streamed=on_token.streamed("https://images/cat.png"))
+    assert "https://images/cat.png" in capsys.readouterr().out
@@ -0,0 +1,91 @@
+import threading
+import pytest
+import memory
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+        self.queries = 0
+        self.during_query = None
+
+    def count(self):
+        return len(self.documents)
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.documents.update(zip(ids, documents))
+
+    def query(self, query_embeddings, n_results=1, include=None):
+        self.queries += 1
+        if self.during_query:
+            self.during_query()
+        docs = list(self.documents.values())[:n_results]
+        return {"documents": [docs for _ in query_embeddings],
+                "distances": [[0.5] * len(docs) for _ in query_embeddings]}
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(memory, "_collection", collection)
+    monkeypatch.setattr(memory, "_pending", [])
+    monkeypatch.setattr(memory, "_recall_cache", memory.OrderedDict())
+    monkeypatch.setattr(memory, "_embedding_cache", memory.OrderedDict())
+    monkeypatch.setattr(memory, "embed", lambda texts: [_direction(text) for text in texts])
+    return collection
+
+
+_directions = {}
+
+
+def _direction(text):
+    """A distinct unit vector per text, so no two memories count as near-duplicates."""
+    index = _directions.setdefault(text, len(_directions))
+    return [1.0 if i == index else 0.0 for i in range(64)]
+
+
+def test_memorize_buffers_until_threshold(collection, monkeypatch):
+    monkeypatch.setattr(memory, "FLUSH_THRESHOLD", 3)
+    memory.memorize("1", "alpha")
+    memory.memorize("2", "beta")
+    assert collection.documents == {}
+    memory.memorize("3", "gamma")
+    assert sorted(collection.documents.values()) == ["alpha", "beta", "gamma"]
+    assert memory._pending == []
+
+
+def test_recall_started_before_a_flush_is_not_cached(collection):
+    memory.memorize("1", "alpha")
+    memory.flush()
+
+    def flush_during_query():
+        collection.during_query = None
+        memory.memorize("2", "beta")
+        memory.flush()
+
+    collection.during_query = flush_during_query
+    memory.recall("anything", n_results=2)
+    assert memory.recall("anything", n_results=2) == ["alpha", "beta"]
+    assert collection.queries == 3  # Both recalls, plus the flush's duplicate check.
+
+
+def test_concurrent_flushes_run_one_at_a_time(collection, monkeypatch):
+    active, overlaps = [], []
+    upsert = collection.upsert
+
+    def slow_upsert(**kwargs):
+        active.append(1)
+        overlaps.append(len(active))
+        threading.Event().wait(0.05)
+        upsert(**kwargs)
+        active.pop()
+
+    collection.upsert = slow_upsert
+    threads = []
+    for number in range(4):
+        memory.memorize(str(number), f"document {number}")
+        threads.append(threading.Thread(target=memory.flush))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+    assert max(overlaps) == 1
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+from roster import Roster
+
+
+def make_roster(*ranks):
+    roster = Roster()
+    agents = [SimpleNamespace(agent_id=f"W-{n}", rank=rank, specialty="Writer") for n, rank in enumerate(ranks)]
+    for agent in agents:
+        roster.add(agent)
+    return roster, agents
+
+
+def test_best_prefers_lowest_rank_then_least_busy():
+    roster, (e1, e2, c1) = make_roster("E", "E", "C")
+    assert roster.best("Writer", "E") in (e1, e2)
+    roster.acquire(e1)
+    assert roster.best("Writer", "E") is e2
+    assert roster.best("Writer", "C") is c1
+    assert roster.best("Writer", "S") is None
+
+
+def test_least_busy_draws_helpers_from_every_qualified_rank():
+    roster, (e1, c1, b1) = make_roster("E", "C", "B")
+    roster.acquire(e1)  # The step's own agent.
+    assert roster.least_busy("Writer", "E", count=3, exclude={e1.agent_id}) == [c1, b1]
+    roster.acquire(c1)
+    assert roster.least_busy("Writer", "E", count=1, exclude={e1.agent_id}) == [b1]
+    assert roster.least_busy("Writer", "C", count=3) == [b1, c1]
+    assert roster.least_busy("Coder", "E", count=3) == []
@@ -0,0 +1,36 @@
+import json
+import os
+import pytest
+from router import GuildRouter, compile_keywords
+
+GUILDS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "guilds.json")
+
+
+@pytest.fixture
+def router():
+    with open(GUILDS) as f:
+        return GuildRouter(json.load(f))
+
+
+@pytest.mark.parametrize("request_text, guild", [
+    ("Write a Python function that reverses a list", "Coder"),
+    ("Draw a logo for a coffee shop", "Artist"),
+    ("Write a report on black holes", "Writer"),
+    ("Help me with coding a parser", "Coder"),
+    ("Tips for programming in Rust", "Coder"),
+    ("A drawing of a cat", "Artist"),
+    ("An illustration of a fox", "Artist"),
+    ("Create artwork for my band", "Artist"),
+    ("Two short stories about the sea", "Writer"),
+])
+def test_inflected_keywords_route(router, request_text, guild):
+    assert router.route(request_text) == guild
+
+
+def test_keywords_only_match_at_word_starts():
+    pattern = compile_keywords(["art", "code"])
+    assert pattern.search("smart contracts") is None
+    assert pattern.search("barcode") is None
+    assert pattern.search("artists").group(1) == "art"
+    assert pattern.search("encoding") is None
+    assert pattern.search("coding").group(2) == "cod"
@@ -0,0 +1,48 @@
+import pytest
+
+from sandbox import SandboxPool
+
+CPU_HEAVY = "while True:\n    pass\n"
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1, timeout=10, cpu_seconds=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_runs_code_and_captures_output(pool):
+    result = pool.run("print(6 * 7)")
+    assert result["stdout"] == "42\n"
+    assert result["error"] is None
+
+
+def test_worker_survives_runs_after_cpu_limit(pool):
+    killed = pool.run(CPU_HEAVY)
+    assert killed["error"]
+    for number in range(3):
+        result = pool.run(f"print({number})")
+        assert result["error"] is None, result["error"]
+        assert result["stdout"] == f"{number}\n"
+
+
+def test_consecutive_cpu_heavy_runs_each_get_a_budget(pool):
+    snippet = "import time\nend = time.process_time() + 0.6\nwhile time.process_time() < end:\n    pass\nprint('done')"
+    for _ in range(3):
+        result = pool.run(snippet)
+        assert result["error"] is None, result["error"]
+        assert result["stdout"] == "done\n"
+
+
+def test_dead_worker_is_replaced(pool):
+    crashed = pool.run("import os\nos._exit(3)")
+    assert crashed["error"]
+    for number in range(3):
+        assert pool.run(f"print({number})")["stdout"] == f"{number}\n"
+
+
+def test_file_descriptor_output_is_captured(pool):
+    result = pool.run("import os, sys\nos.system('echo from-shell')\nsys.__stdout__.write('raw\\n')")
+    assert "from-shell" in result["stdout"]
+    assert "raw" in result["stdout"]
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+import pytest
+import agent
+import scheduler
+from scheduler import RequestScheduler, TokenBucket
+
+
+class Dropped(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def retry_dropped_connections(monkeypatch):
+    monkeypatch.setattr(scheduler, "_is_retryable", lambda error: isinstance(error, Dropped))
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(30, bucket.updated) == pytest.approx(30.0)
+    bucket.adjust(1000)
+    assert bucket.tokens == 60
+
+
+def test_retryable_errors_are_retried():
+    scheduler_ = RequestScheduler(limits={}, base_delay=0.001)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Dropped()
+        return "ok"
+
+    assert scheduler_.call("model", flaky) == "ok"
+    assert scheduler_.retries == 2
+
+
+def test_usage_from_a_consumed_stream_corrects_the_token_quota():
+    scheduler_ = RequestScheduler(limits={"model": {"tpm": 1000}})
+    result = scheduler_.call("model", lambda: iter(["a", "b"]), estimated_tokens=500,
+                             consume=lambda stream, attempt: ("".join(stream), SimpleNamespace(total_tokens=100)))
+    assert result == "ab"
+    assert scheduler_._buckets_for("model")[1].tokens == pytest.approx(900, abs=1)
+
+
+def _chunk(text=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text, tool_calls=None))] if text else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_stream_that_breaks_off_is_retried(monkeypatch):
+    streams = []
+
+    def create(**request):
+        streams.append(request)
+        if len(streams) == 1:
+            def broken():
+                yield _chunk("Hel")
+                raise Dropped()
+            return broken()
+        return iter([_chunk("Hello"), _chunk(usage=SimpleNamespace(total_tokens=42))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    test_scheduler = RequestScheduler(limits={"gpt-4o": {"tpm": 100000}}, base_delay=0.001)
+    monkeypatch.setattr(agent, "get_client", lambda: client)
+    monkeypatch.setattr(agent, "request_scheduler", test_scheduler)
+
+    pieces = []
+    reply, usage = agent._stream_completion(pieces.append, 0, model="gpt-4o", messages=[])
+    assert reply == {"role": "assistant", "content": "Hello"}
+    assert usage.total_tokens == 42
+    assert pieces[0] == "Hel" and "again" in pieces[1] and pieces[2] == "Hello"
+    assert len(streams) == 2 and test_scheduler.retries == 1
+
+
+def test_no_token_quota_unless_configured(monkeypatch):
+    monkeypatch.delenv("MONARCH_RATE_LIMITS", raising=False)
+    assert "tpm" not in scheduler._load_limits()["gpt-4o"]
+    monkeypatch.setenv("MONARCH_RATE_LIMITS", '{"gpt-4o": {"tpm": 800000}}')
+    assert scheduler._load_limits()["gpt-4o"] == {"rpm": 500, "tpm": 800000}
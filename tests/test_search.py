@@ -0,0 +1,17 @@
+import pytest
+
+from search import SearchService, SerpApiBackend, FixtureBackend
+
+
+def test_missing_serpapi_key_is_a_clear_error(monkeypatch):
+    monkeypatch.delenv("SERPAPI_API_KEY", raising=False)
+    service = SearchService(backend=SerpApiBackend())
+    with pytest.raises(RuntimeError, match="SERPAPI_API_KEY is not set"):
+        service.search("anything")
+
+
+def test_repeated_queries_are_cached():
+    service = SearchService(backend=FixtureBackend())
+    first = service.search("Black Holes")
+    assert service.search("  black   holes ") == first
+    assert service.stats() == {"hits": 1, "misses": 1, "shared": 0}
@@ -0,0 +1,76 @@
+import json
+import threading
+import pytest
+import main
+from server import MonarchServer, MonarchClient
+
+
+class FakeMonarch:
+    army = {}
+
+    def execute_job(self, prompt, budget=200):
+        if prompt == "fail":
+            return None, ["nothing worked"], "FAILED"
+        return f"done: {prompt}", [f"ran {prompt}"], "COMPLETED"
+
+    def flush_army(self):
+        pass
+
+    def save_army(self):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = MonarchServer(FakeMonarch(), queue_path=str(tmp_path / "jobs.db"), port=0, workers=2)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    yield server
+    server.stop()
+    thread.join()
+
+
+def test_jobs_run_through_the_server(server):
+    client = MonarchClient(server.address)
+    job = client.wait(client.submit("hello"), poll_interval=0.05, timeout=5)
+    assert (job["status"], job["result"], job["history"]) == ("COMPLETED", "done: hello", ["ran hello"])
+    assert client.health()["jobs"]["COMPLETED"] == 1
+
+
+def test_remote_batch_reports_bad_lines_and_failures(server, tmp_path, capsys):
+    batch = tmp_path / "batch.jsonl"
+    batch.write_text('"hello"\n{not json\n{"prompt": "fail"}\n{"prompt": "x", "budget": "lots"}\n')
+    main.run_remote_batch(MonarchClient(server.address), str(batch), wait_timeout=5)
+    # The server runs in this process, so its own log lines are mixed into stdout.
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    assert [record["status"] for record in records] == ["COMPLETED", "FAILED", "FAILED", "FAILED"]
+    assert records[0]["result"] == "done: hello"
+    assert "not valid JSON" in records[1]["error"]
+    assert records[2]["history"] == ["nothing worked"]
+    assert "rejected" in records[3]["error"]
+
+
+def test_wait_gives_up_after_its_timeout(monkeypatch):
+    client = MonarchClient("http://127.0.0.1:1")
+    monkeypatch.setattr(client, "get", lambda job_id: {"status": "RUNNING"})
+    with pytest.raises(TimeoutError):
+        client.wait("abc", poll_interval=0.01, timeout=0.05)
+
+
+def test_unreachable_server_is_a_connection_error():
+    with pytest.raises(ConnectionError, match="Could not reach the Monarch server"):
+        MonarchClient("http://127.0.0.1:1", timeout=1).health()
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"prompt": "x", "budget": -5}, "non-negative integer"),
+    ({"prompt": "x", "budget": True}, "non-negative integer"),
+    ({"prompt": "x", "budget": "200"}, "non-negative integer"),
+    ({"prompt": "  "}, "prompt"),
+    (["not", "an", "object"], "JSON object"),
+])
+def test_invalid_jobs_are_rejected(server, payload, message):
+    client = MonarchClient(server.address)
+    with pytest.raises(RuntimeError, match=message):
+        client._request("POST", "/jobs", payload)
+    assert client.health()["jobs"]["QUEUED"] == 0
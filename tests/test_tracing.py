@@ -0,0 +1,12 @@
+from tracing import Tracer
+
+
+def test_span_cap_keeps_the_most_recent_spans():
+    tracer = Tracer()
+    tracer.enable(max_spans=3)
+    for number in range(5):
+        with tracer.span(f"op {number}"):
+            pass
+    assert [span.name for span in tracer.spans] == ["op 2", "op 3", "op 4"]
+    assert tracer.dropped == 2
+    assert "2 older ones were dropped" in tracer.summary()
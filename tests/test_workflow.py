@@ -0,0 +1,84 @@
+import threading
+import pytest
+from workflow import build_graph, render_template, run_workflow
+
+
+def step(name, task="", **extra):
+    return {"role": "Worker", "min_rank": "F", "artifact_name": name, "task": task, **extra}
+
+
+def test_render_template_fills_placeholders_once():
+    values = {"request": "say {draft}", "draft": "never inserted"}
+    assert render_template("Do: {request} / {missing}", values) == "Do: say {draft} / {missing}"
+
+
+def test_build_graph_follows_placeholders_and_depends_on():
+    workflow = [step("outline", "{request}"), step("draft", "{outline}"),
+                step("notes", "{request}"), step("final", "ignored {draft}", depends_on=["draft", "notes"])]
+    assert build_graph(workflow) == {0: set(), 1: {0}, 2: set(), 3: {1, 2}}
+
+
+@pytest.mark.parametrize("workflow, message", [
+    ([step("a"), step("a")], "more than one"),
+    ([step("a", depends_on=["nowhere"])], "unknown artifacts"),
+    ([step("a", "{b}"), step("b", "{a}")], "cycle"),
+])
+def test_build_graph_rejects_bad_workflows(workflow, message):
+    with pytest.raises(ValueError, match=message):
+        build_graph(workflow)
+
+
+def test_fan_out_runs_concurrently_and_fans_in():
+    workflow = [step("left", "{request}"), step("right", "{request}"), step("joined", "{left} {right}")]
+    both_running = threading.Barrier(2, timeout=5)  # Breaks (and fails the step) unless both run at once.
+    order = []
+
+    def run_step(s):
+        if s["artifact_name"] != "joined":
+            both_running.wait()
+        order.append(s["artifact_name"])
+        return s["artifact_name"]
+
+    assert run_workflow(workflow, build_graph(workflow), run_step)
+    assert order[-1] == "joined"
+
+
+def test_no_new_steps_start_after_a_failure():
+    workflow = [step("first", "{request}"), step("second", "{first}")]
+    started = []
+
+    def run_step(s):
+        started.append(s["artifact_name"])
+        return None
+
+    assert not run_workflow(workflow, build_graph(workflow), run_step)
+    assert started == ["first"]
+
+
+def test_a_step_that_raises_counts_as_failed():
+    workflow = [step("only")]
+
+    def run_step(s):
+        raise RuntimeError("boom")
+
+    assert not run_workflow(workflow, build_graph(workflow), run_step)
+
+
+@pytest.mark.parametrize("eager_handoff", [False, True])
+def test_eager_handoff_starts_the_next_step_before_bookkeeping(eager_handoff):
+    workflow = [step("first", "{request}"), step("second", "{first}")]
+    events = []
+    second_started = threading.Event()
+
+    def run_step(s):
+        if s["artifact_name"] == "second":
+            second_started.set()
+        return s["artifact_name"]
+
+    def on_complete(s, result):
+        if s["artifact_name"] == "first":
+            # With eager handoff the next step is already on its way while this runs.
+            events.append(("second started before bookkeeping", second_started.wait(0.5 if eager_handoff else 0)))
+
+    assert run_workflow(workflow, build_graph(workflow), run_step, on_complete, eager_handoff=eager_handoff)
+    assert events == [("second started before bookkeeping", eager_handoff)]
@@ -1,47 +1,91 @@
 #tools.py
-import os
-import io
-import sys
-from contextlib import redirect_stdout
-from serpapi import GoogleSearch
-
-def web_search(query: str):
-    """Perform a web search using serpApi and returns the answer."""
-    print(f"---Performing web search for {query}---")
-    try:
-        params={
-            "api_key": os.environ["SERPAPI_API_KEY"],
-            "engine": "google",
-            "q": query,
-        }
-        search = GoogleSearch(params)
-        results=search.get_dict()
-
-        if "answer_box" in results:
-            return str(results["answer_box"])
-        elif "organic_results" in results and results["organic_results"]:
-            return str(results["organic_results"][0].get("snippet", "No snippet found."))
-        else:
-            return "No definitive results found."
-    except Exception as e:
-        return f"Error during web search (e)"
+from sandbox import SandboxPool
+from search import SearchService
+
+# Agent code runs in separate, pre-started interpreters, never in the Monarch process itself.
+sandbox_pool = SandboxPool()
+# Shared by every agent so repeated and concurrent searches reuse cached or in-flight results.
+search_service = SearchService()
+
+def _format_results(query, results):
+    if isinstance(results, Exception):
+        return f"Error during web search for '{query}': {results}"
+    if not results:
+        return f"No definitive results found for '{query}'."
+    lines = [f"Results for '{query}':"]
+    for result in results:
+        source = f" ({result['link']})" if result.get("link") else ""
+        lines.append(f"- {result.get('title', '')}: {result.get('snippet', '')}{source}")
+    return "\n".join(lines)
+
+
+def web_search(query: str = None, queries: list = None):
+    """Perform one web search, or several in parallel, and returns the top results of each."""
+    queries = ([query] if query else []) + list(queries or [])
+    if not queries:
+        return "No search query was given."
+    print(f"---Performing web search for {queries}---")
+    if len(queries) == 1:
+        try:
+            return _format_results(queries[0], search_service.search(queries[0]))
+        except Exception as e:
+            return _format_results(queries[0], e)
+    results = search_service.search_many(queries)
+    return "\n\n".join(_format_results(q, results[q]) for q in queries)
 
 def run_code(code :str)->str:
-    """Execute a string of python code and captures its output and errors."""
+    """Execute a string of python code in a sandboxed worker and captures its output and errors."""
     print(f"---Running code in interpreter-----\n {code[:200]}....\n---------------")
-    output_stream = io.StringIO()
-    try:
-        with redirect_stdout(output_stream):
-            exec(code,{})
-        output = output_stream.getvalue()
-        if not output:
-            return "Excetion Successful: No output produced "
-        return f"Execution Successful:\n---\n{output}\n-----"
-    except Exception as e:
-        return f"Error during execution of code (e)"
+    result = sandbox_pool.run(code)
+    output = result["stdout"]
+    if result["stderr"]:
+        output += f"\n[stderr]\n{result['stderr']}"
+    if result["truncated"]:
+        output += "\n[output truncated]"
+    if result["error"]:
+        return f"Error during execution of code:\n---\n{result['error']}\n{output}\n-----"
+    if not output:
+        return "Execution Successful: No output produced "
+    return f"Execution Successful:\n---\n{output}\n-----"
 
 
 AVAILABLE_TOOLS={
     "web_search": web_search,
     "code_interpreter": run_code,
-}
\ No newline at end of file
+}
+
+# Structured descriptions of AVAILABLE_TOOLS for native function calling.
+# Parameter names must match the keyword arguments of the tool functions.
+TOOL_SCHEMAS=[
+    {
+        "type": "function",
+        "function": {
+            "name": "web_search",
+            "description": "Search the web for current facts, news or reference material. "
+                           "Pass several queries at once to research related questions in parallel.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "The search query."},
+                    "queries": {"type": "array", "items": {"type": "string"},
+                                "description": "Additional queries to run in parallel."},
+                },
+                "required": ["query"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "code_interpreter",
+            "description": "Run a Python script and return everything it printed, or the error it raised.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "code": {"type": "string", "description": "The complete Python source to execute."},
+                },
+                "required": ["code"],
+            },
+        },
+    },
+]
\ No newline at end of file
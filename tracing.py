@@ -0,0 +1,192 @@
+# tracing.py
+import contextvars
+import itertools
+from collections import deque
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# USD per 1M tokens (text models) or per image (image models). Update when provider prices change.
+MODEL_PRICING = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "dall-e-3": {"image": 0.040},
+}
+
+
+def llm_cost(model, prompt_tokens=0, completion_tokens=0, images=0):
+    """The dollar cost of a model call, or 0.0 for models without a known price."""
+    price = MODEL_PRICING.get(model, {})
+    return (prompt_tokens * price.get("input", 0.0) + completion_tokens * price.get("output", 0.0)) / 1_000_000 \
+        + images * price.get("image", 0.0)
+
+
+class Span:
+    """One timed operation (a job, workflow step, memory recall, tool call or LLM call)."""
+
+    def __init__(self, span_id, name, kind, parent_id, attrs):
+        self.span_id = span_id
+        self.name = name
+        self.kind = kind
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        """Records attributes on the span, replacing earlier values."""
+        self.attrs.update(attrs)
+
+    def add(self, **amounts):
+        """Adds to numeric attributes (e.g. queue wait accumulated across retries)."""
+        for key, value in amounts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+class _NullSpan:
+    """Stands in for a span while tracing is off, so instrumented code needs no checks."""
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, **amounts):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_current_span = contextvars.ContextVar("monarch_current_span", default=None)
+
+
+class Tracer:
+    """
+    Collects nested spans. Tracing is off by default and costs almost nothing until enabled.
+    A span's parent is whichever span is current in the calling context; work handed to other
+    threads keeps its parent as long as it runs in a copy of the submitting context.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = deque()
+        self.dropped = 0  # Spans discarded to stay within max_spans.
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self, max_spans=None):
+        """Starts tracing; with `max_spans`, only the most recent spans are kept."""
+        self.enabled = True
+        self._origin = time.perf_counter()
+        with self._lock:
+            self.spans = deque(self.spans, maxlen=max_spans)
+
+    @contextmanager
+    def span(self, name, kind="internal", **attrs):
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(next(self._ids), name, kind, parent.span_id if parent else None, attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=f"{e.__class__.__name__}: {e}")
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            with self._lock:
+                if len(self.spans) == self.spans.maxlen:
+                    self.dropped += 1
+                self.spans.append(span)
+
+    def current(self):
+        """The innermost open span in this context (a no-op span if there is none)."""
+        return _current_span.get() or _NULL_SPAN
+
+    def export_jsonl(self, path):
+        """Writes one JSON object per span."""
+        with open(path, 'w') as f:
+            for span in self._finished():
+                f.write(json.dumps({
+                    "id": span.span_id, "parent_id": span.parent_id, "name": span.name, "kind": span.kind,
+                    "start_s": round(span.start - self._origin, 6), "duration_s": round(span.duration, 6),
+                    "thread": span.thread_id, **span.attrs,
+                }, default=str) + "\n")
+
+    def export_chrome(self, path):
+        """Writes the Chrome trace event format (open in chrome://tracing or Perfetto)."""
+        events = [{
+            "name": span.name, "cat": span.kind, "ph": "X", "pid": os.getpid(), "tid": span.thread_id,
+            "ts": round((span.start - self._origin) * 1e6), "dur": round(span.duration * 1e6),
+            "args": span.attrs,
+        } for span in self._finished()]
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def export(self, path):
+        """Exports JSONL for ".jsonl" paths and the Chrome trace format otherwise."""
+        if path.endswith(".jsonl"):
+            self.export_jsonl(path)
+        else:
+            self.export_chrome(path)
+
+    def _finished(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span.start)
+
+    def summary(self):
+        """
+        A per-operation table: calls, wall time, queue wait, tokens, dollar cost, budget units
+        and cache hits. Costs and tokens of LLM calls are also rolled up into their steps and jobs.
+        """
+        spans = self._finished()
+        by_id = {span.span_id: span for span in spans}
+        rows = {}
+
+        def row(kind, name):
+            return rows.setdefault((kind, name), {"calls": 0, "wall": 0.0, "queue": 0.0, "tokens_in": 0,
+                                                  "tokens_out": 0, "usd": 0.0, "units": 0, "cache_hits": 0})
+
+        for span in spans:
+            entry = row(span.kind, span.name)
+            entry["calls"] += 1
+            entry["wall"] += span.duration
+            entry["queue"] += span.attrs.get("queue_wait_s", 0.0)
+            entry["units"] += span.attrs.get("budget_units", 0)
+            entry["cache_hits"] += 1 if span.attrs.get("cache_hit") else 0
+            if span.kind == "llm":
+                # Charge the call to itself and to every workflow step and job it ran under.
+                targets = [entry]
+                parent = by_id.get(span.parent_id)
+                while parent:
+                    if parent.kind in ("step", "job"):
+                        targets.append(row(parent.kind, parent.name))
+                    parent = by_id.get(parent.parent_id)
+                for target in targets:
+                    target["tokens_in"] += span.attrs.get("prompt_tokens", 0)
+                    target["tokens_out"] += span.attrs.get("completion_tokens", 0)
+                    target["usd"] += span.attrs.get("cost_usd", 0.0)
+
+        header = f"{'kind':<7} {'operation':<32} {'calls':>5} {'wall s':>8} {'mean s':>7} {'queue s':>7} " \
+                 f"{'tok in':>7} {'tok out':>7} {'cost $':>8} {'units':>5} {'cached':>6}"
+        lines = [header, "-" * len(header)]
+        if self.dropped:
+            lines.insert(0, f"(covers the last {len(spans)} spans; {self.dropped} older ones were dropped)")
+        for (kind, name), entry in sorted(rows.items(), key=lambda item: -item[1]["wall"]):
+            lines.append(
+                f"{kind:<7} {name[:32]:<32} {entry['calls']:>5} {entry['wall']:>8.2f} "
+                f"{entry['wall'] / entry['calls']:>7.2f} {entry['queue']:>7.2f} {entry['tokens_in']:>7} "
+                f"{entry['tokens_out']:>7} {entry['usd']:>8.4f} {entry['units']:>5} {entry['cache_hits']:>6}"
+            )
+        return "\n".join(lines)
+
+
+# The process-wide tracer, switched on by `monarch --profile` or `--trace`.
+tracer = Tracer()
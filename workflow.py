@@ -0,0 +1,122 @@
+# workflow.py
+import contextvars
+import re
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Matches "{artifact}" placeholders in a step's task template.
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+
+
+@lru_cache(maxsize=256)
+def compile_template(template):
+    """
+    Splits a task template into literal text and placeholder names, once per template.
+    Returns a tuple where odd positions are placeholder names.
+    """
+    return tuple(PLACEHOLDER_PATTERN.split(template))
+
+
+def render_template(template, values):
+    """
+    Fills "{name}" placeholders from `values` in a single pass. Values are converted with str(),
+    so artifacts kept on disk are only read when a template actually uses them. Placeholders
+    without a value are left as they are, and inserted text is never itself substituted.
+    """
+    parts = compile_template(template)
+    pieces = []
+    for index, part in enumerate(parts):
+        if index % 2 == 0:
+            pieces.append(part)
+        elif part in values:
+            pieces.append(str(values[part]))
+        else:
+            pieces.append("{" + part + "}")
+    return "".join(pieces)
+
+
+def build_graph(workflow):
+    """
+    Works out which steps each workflow step depends on.
+    A step depends on every step whose artifact it references as a "{placeholder}" in its task,
+    unless it lists its inputs explicitly with "depends_on". Returns {step_index: set(step_indexes)}.
+    """
+    producers = {}
+    for index, step in enumerate(workflow):
+        if step["artifact_name"] in producers:
+            raise ValueError(f"Artifact '{step['artifact_name']}' is produced by more than one workflow step.")
+        producers[step["artifact_name"]] = index
+
+    graph = {}
+    for index, step in enumerate(workflow):
+        if "depends_on" in step:
+            inputs = step["depends_on"]
+            unknown = [name for name in inputs if name not in producers]
+            if unknown:
+                raise ValueError(f"Step '{step['artifact_name']}' depends on unknown artifacts: {unknown}")
+        else:
+            inputs = [name for name in PLACEHOLDER_PATTERN.findall(step["task"]) if name in producers]
+        graph[index] = {producers[name] for name in inputs if producers[name] != index}
+
+    # Reject cycles up front so a bad guilds.json can't hang a job.
+    visiting, done = set(), set()
+
+    def visit(index):
+        if index in done:
+            return
+        if index in visiting:
+            raise ValueError(f"Workflow has a dependency cycle through '{workflow[index]['artifact_name']}'.")
+        visiting.add(index)
+        for dependency in graph[index]:
+            visit(dependency)
+        visiting.discard(index)
+        done.add(index)
+
+    for index in graph:
+        visit(index)
+    return graph
+
+
+def run_workflow(workflow, graph, run_step, on_complete=None, eager_handoff=False):
+    """
+    Runs each step as soon as all of its inputs exist, with independent steps running concurrently.
+    `run_step(step)` returns the step's result, or a falsy value if the step failed.
+    `on_complete(step, result)` handles per-step bookkeeping. With `eager_handoff` the steps that
+    were waiting on a result are started before that bookkeeping runs instead of after it.
+    Once a step fails no new steps are started; returns True only if every step succeeded.
+    """
+    remaining = {index: set(dependencies) for index, dependencies in graph.items()}
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max(len(workflow), 1)) as executor:
+        running = {}
+
+        def start_ready_steps():
+            for index in [i for i, dependencies in remaining.items() if not dependencies]:
+                del remaining[index]
+                # Each step runs in a copy of this context, so its trace spans nest under the job's.
+                running[executor.submit(contextvars.copy_context().run, run_step, workflow[index])] = index
+
+        start_ready_steps()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Workflow step '{workflow[index]['artifact_name']}' raised an error: {e}")
+                    result = None
+                if not result:
+                    failed = True
+                    continue
+                for dependencies in remaining.values():
+                    dependencies.discard(index)
+                if eager_handoff and not failed:
+                    start_ready_steps()
+                if on_complete:
+                    on_complete(workflow[index], result)
+            if not failed:
+                start_ready_steps()
+
+    return not failed and not remaining